@@ -0,0 +1,103 @@
+import logging
+import tarfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Sequence, Set, Tuple
+
+from .exceptions import SecurityError
+
+logger = logging.getLogger("nexus.bundle")
+
+# kind -> (manifiesto que calcula el motor, directorio servido)
+BUNDLE_KINDS = {
+    "scripts": ("script_manifest", "files/scripts"),
+    "skels": ("skel_manifest", "files/skels"),
+    "certs": ("cert_manifest", "files/certs"),
+}
+
+# (ruta relativa en el tar, hash del servidor, override)
+BundleEntry = Tuple[str, str, bool]
+
+
+def parse_client_hashes(body: str) -> Dict[str, Set[str]]:
+    """
+    Lista del cliente: una línea "<md5|-> <ruta>" por archivo local.
+    Una ruta puede repetirse (un skel en el home de varios usuarios).
+    """
+    hashes: Dict[str, Set[str]] = {}
+    for line in body.splitlines():
+        parts = line.strip().split(maxsplit=1)
+        if len(parts) != 2:
+            continue
+        digest, path = parts
+        hashes.setdefault(path.strip(), set()).add(digest)
+    return hashes
+
+
+def manifest_entries(kind: str, manifest: Sequence[Mapping[str, Any]]) -> List[BundleEntry]:
+    """Archivos descargables de un manifiesto (los marcados remove no viajan)."""
+    entries: List[BundleEntry] = []
+    for item in manifest:
+        if item.get("remove"):
+            continue
+        if kind == "certs":
+            for f in item.get("files", []):
+                path = f"{item['domain']}/{f['name']}"
+                entries.append((path, f["hash"], bool(item.get("override"))))
+            continue
+        name = item["name"] if kind == "scripts" else item["src_name"]
+        if item.get("hash"):
+            entries.append((name, item["hash"], bool(item.get("override"))))
+    return entries
+
+
+def select_members(
+    kind: str, manifest: Sequence[Mapping[str, Any]], client_hashes: Dict[str, Set[str]]
+) -> List[Tuple[str, Path]]:
+    """
+    Archivos a enviar: solo los que el cliente lista y que tiene con otro
+    contenido (o ausentes, "-"), más los override que haya listado.
+    """
+    base = Path(BUNDLE_KINDS[kind][1]).resolve()
+    members = []
+    for path, server_hash, override in manifest_entries(kind, manifest):
+        reported = client_hashes.get(path)
+        if not reported:
+            continue
+        if not override and reported == {server_hash}:
+            continue
+        target = (base / path).resolve()
+        if not target.is_relative_to(base):
+            raise SecurityError(f"Path Injection Attempt: {path}")
+        if target.is_file():
+            members.append((path, target))
+    return members
+
+
+class _Sink:
+    """Destino de escritura para tarfile que se vacía entre miembros."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        parts, self._parts = self._parts, []
+        yield from parts
+
+
+def stream_tar(members: Sequence[Tuple[str, Path]]) -> Iterator[bytes]:
+    """Tar en streaming: en memoria nunca hay más de un archivo a la vez."""
+    sink = _Sink()
+    tar = tarfile.open(fileobj=sink, mode="w|", format=tarfile.GNU_FORMAT)
+    for arcname, path in members:
+        info = tar.gettarinfo(str(path), arcname=arcname)
+        info.uid = info.gid = 0
+        info.uname = info.gname = "root"
+        with open(path, "rb") as fh:
+            tar.addfile(info, fh)
+        yield from sink.drain()
+    tar.close()
+    yield from sink.drain()
@@ -0,0 +1,108 @@
+import gzip
+from typing import Callable, Dict, Optional
+
+from .cache import ByteLRU
+from .config import get_settings
+
+# zstd es opcional: stdlib en Python >= 3.14, o el paquete `zstandard`
+try:
+    from compression import zstd as _zstd  # type: ignore[import-not-found]
+
+    def _zstd_compress(data: bytes) -> bytes:
+        return _zstd.compress(data, level=10)
+
+except ImportError:
+    try:
+        import zstandard as _zstd  # type: ignore[import-not-found]
+
+        def _zstd_compress(data: bytes) -> bytes:
+            return _zstd.ZstdCompressor(level=10).compress(data)
+
+    except ImportError:
+        _zstd_compress = None
+
+# Preferencia del servidor ante igualdad de q en Accept-Encoding
+SUPPORTED = ("zstd", "gzip") if _zstd_compress else ("gzip",)
+# Sufijo del ETag por representación (un ETag fuerte por codificación)
+ETAG_SUFFIX = {"zstd": "zst", "gzip": "gz"}
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Codificación a usar según Accept-Encoding (None = identidad)."""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return _zstd_compress(data)
+    # mtime=0: misma entrada, mismos bytes (el ETag de la variante es estable)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag de la representación comprimida: "<hash>" -> "<hash>-gz"."""
+    if not encoding:
+        return etag
+    return f'{etag.rstrip(chr(34))}-{ETAG_SUFFIX[encoding]}"'
+
+
+class CompressedVariants:
+    """
+    Variantes comprimidas indexadas por hash de contenido: cada script o
+    archivo se comprime una sola vez por codificación.
+    """
+
+    def __init__(self, max_bytes: int, min_size: int):
+        self.lru = ByteLRU(max_bytes)
+        self.min_size = min_size
+
+    def select(self, size: int, accept_encoding: Optional[str]) -> Optional[str]:
+        """Codificación para un cuerpo de `size` bytes (None = sin comprimir)."""
+        if size < self.min_size:
+            return None
+        return negotiate(accept_encoding)
+
+    def get(self, content_hash: str, encoding: str, load: Callable[[], bytes]) -> bytes:
+        """Variante comprimida; `load` solo se invoca si no estaba en caché."""
+        key = (content_hash, encoding)
+        cached = self.lru.get(key)
+        if cached is None:
+            cached = compress(load(), encoding)
+            self.lru.put(key, cached, len(cached))
+        return cached
+
+    def cached(self, content_hash: str, encoding: str) -> Optional[bytes]:
+        """Variante ya comprimida, o None (sin comprimir nada)."""
+        return self.lru.get((content_hash, encoding))
+
+    def put(self, content_hash: str, encoding: str, body: bytes):
+        """Inserta una variante ya comprimida (p. ej. por el pre-render)."""
+        self.lru.put((content_hash, encoding), body, len(body))
+
+    def stats(self) -> Dict[str, int]:
+        return self.lru.stats()
+
+
+compressed_variants = CompressedVariants(
+    get_settings().nexus_compression_cache_bytes,
+    get_settings().nexus_compression_min_bytes,
+)
@@ -1,6 +1,9 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 from functools import lru_cache
+import logging
+
+logger = logging.getLogger("nexus.config")
 
 class Settings(BaseSettings):
     # Usamos Field con default None para que Pydantic lo busque en el entorno
@@ -9,6 +12,62 @@ class Settings(BaseSettings):
     nexus_api_key_legacy: str = Field(default="")
 
     nexus_dashboard_allowed_ips: str = "127.0.0.1"
+    # Caché de los recuentos del dashboard (segundos)
+    nexus_status_counts_ttl: float = 15.0
+
+    # Cargador de inventario: "native" (en proceso) o "ansible" (subproceso)
+    nexus_inventory_loader: str = "native"
+    # Diffs entre generaciones que se conservan para GET /inventory/changes
+    nexus_inventory_changes_keep: int = 64
+    # Watcher de inventory/: "auto" | "inotify" | "poll" | "off"
+    nexus_watch_mode: str = "auto"
+    nexus_watch_debounce_ms: int = 500
+    nexus_watch_poll_interval: float = 2.0
+    # Bytecode de plantillas Jinja compiladas (persistente entre reinicios)
+    nexus_jinja_cache_dir: str = "data/jinja_cache"
+    # Entrega de /get-task: "buffered" (caché + ETag/304) o "stream" (línea a
+    # línea, memoria acotada, sin ETag)
+    nexus_render_mode: str = "buffered"
+    # Memo de fragmentos renderizados compartido entre hosts (0 = desactivado)
+    nexus_fragment_cache_bytes: int = 32 * 1024 * 1024
+    # Variantes gzip/zstd de scripts y archivos servidos
+    nexus_compression_cache_bytes: int = 64 * 1024 * 1024
+    nexus_compression_min_bytes: int = 512
+    # Snapshot de inventario compartido entre workers (un propietario lo
+    # publica cifrado en disco) y arranque en caliente desde el último publicado
+    nexus_shared_snapshot: bool = True
+    nexus_shared_snapshot_path: str = "data/inventory.snapshot"
+    nexus_shared_poll_interval: float = 1.0
+    # Archivos servidos (/scripts, /skels, /certs) en memoria: tope total y
+    # tamaño máximo por archivo (los mayores se sirven desde disco)
+    nexus_static_cache_bytes: int = 64 * 1024 * 1024
+    nexus_static_max_file_bytes: int = 1024 * 1024
+    # Procesos del pre-render de la flota (0 = uno por CPU)
+    nexus_prerender_workers: int = 0
+    # Escritura diferida de /record: tamaño de lote, latencia máxima y cola
+    nexus_record_batch_size: int = 200
+    nexus_record_batch_latency_ms: int = 250
+    nexus_record_queue_max: int = 10000
+    # Control de admisión de /get-task y /record: peticiones en curso antes de
+    # responder 503 (0 = sin límite) y base del Retry-After (más jitter)
+    nexus_max_inflight: int = 256
+    nexus_retry_after_seconds: int = 30
+    # Histórico de telemetría: crudo -> horario -> diario -> borrado
+    nexus_telemetry_history: bool = True
+    nexus_telemetry_raw_days: int = 7
+    nexus_telemetry_hourly_days: int = 90
+    nexus_telemetry_retention_days: int = 365
+    nexus_telemetry_compact_interval: float = 3600.0
+    # Perfilado opt-in por petición: directorio rotatorio, perfiles que se
+    # conservan, máximo por minuto e intervalo del muestreo
+    nexus_profile_dir: str = "data/profiles"
+    nexus_profile_keep: int = 50
+    nexus_profile_max_per_minute: int = 6
+    nexus_profile_sample_interval_ms: float = 5.0
+    # SQLite: hilos del pool de DB, espera ante bloqueo y memoria mapeada
+    nexus_db_threads: int = 4
+    nexus_db_busy_timeout_ms: int = 5000
+    nexus_db_mmap_bytes: int = 256 * 1024 * 1024
     # registrator_server: str = "one.esvibox.com"
     # registrator_port: int = 80
 
@@ -22,6 +81,5 @@ class Settings(BaseSettings):
 def get_settings():
     s = Settings()
     # Esto nos dirá qué ha cargado Pydantic realmente al arrancar
-    key_check = s.nexus_api_key[:3] if s.nexus_api_key else "VACÍA"
-    print(f"DEBUG: Pydantic cargó API_KEY: {key_check}...")
+    logger.debug(f"Settings loaded (API key {'set' if s.nexus_api_key else 'EMPTY'})")
     return s
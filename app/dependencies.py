@@ -1,21 +1,21 @@
 import ipaddress
+import logging
 from fastapi import Header, HTTPException, Request, status, Depends
 from .config import get_settings, Settings
 
+logger = logging.getLogger("nexus.auth")
+
 
 async def verify_nexus_key(
     x_nexus_key: str = Header(None), settings: Settings = Depends(get_settings)
 ):
-    # --- DEBUG TEMPORAL ---
-    print(f"DEBUG: Recibido en Header: {repr(x_nexus_key)}")
-    print(f"DEBUG: Esperado en Config: {repr(settings.nexus_api_key)}")
-    # ----------------------
-
     allowed_keys = [settings.nexus_api_key]
     if settings.nexus_api_key_legacy:
         allowed_keys.append(settings.nexus_api_key_legacy)
 
     if x_nexus_key not in allowed_keys:
+        # Nunca se registra la clave recibida ni la esperada, solo el rechazo
+        logger.debug(f"Rejected Nexus key (header present: {x_nexus_key is not None})")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing Nexus Key",
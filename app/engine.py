@@ -3,49 +3,170 @@ import base64
 import hashlib
 import json
 import logging
-import os
+import time
+from collections import ChainMap, deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
-
-from jinja2 import Environment, FileSystemLoader, StrictUndefined, exceptions
-
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    StrictUndefined,
+    exceptions,
+)
+
+from .bundle import BUNDLE_KINDS
 from .config import get_settings
 from .exceptions import InventoryError, RenderingError, SecurityError
+from .file_index import FileHashIndex
+from .fragments import FragmentMemo
+from .inventory import InventoryLoader
+from .metrics import (
+    hash_seconds,
+    inventory_changes_total,
+    inventory_fetch_seconds,
+    template_render_seconds,
+)
+from .minify import MinifyingLoader
+from .scheduler import poll_slot
+from .shared import SharedSnapshotStore
+from .snapshot import InventoryDiff, InventorySnapshot, thaw
+from .static_files import StaticFiles, is_served
+from .watcher import InventoryWatcher
 
 logger = logging.getLogger("nexus.engine")
 
-
 class NexusEngine:
+    # Plantillas que no salen de ningún nexus_workflow pero se sirven siempre
+    BASE_TEMPLATES = ("base/header", "base/purge")
+
     def __init__(self, template_dir: str = "templates"):
         self.template_base = Path(template_dir).resolve(strict=True)
+        # Bytecode persistente: un reinicio no vuelve a compilar plantillas
+        # (Jinja invalida cada entrada por checksum del fuente)
+        cache_dir = Path(get_settings().nexus_jinja_cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
         self.jinja_env = Environment(
-            loader=FileSystemLoader(str(self.template_base)),
+            # Fuente minificado al cargar: el render no necesita post-proceso
+            loader=MinifyingLoader(str(self.template_base)),
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
             undefined=StrictUndefined,
             auto_reload=False,
             trim_blocks=True,
             lstrip_blocks=True,
         )
-        self._inventory_cache: Dict[str, Any] = {}
-        self._last_update: Optional[datetime] = None
-        self._lock = asyncio.Lock()
+        # Snapshot inmutable vigente; se sustituye atómicamente en cada recarga
+        self._snapshot: Optional[InventorySnapshot] = None
+        self._lock = asyncio.Lock()  # Solo serializa recargas, nunca lectores
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Últimos diffs entre generaciones (GET /inventory/changes)
+        self._changes: Deque[InventoryDiff] = deque(
+            maxlen=max(get_settings().nexus_inventory_changes_keep, 1)
+        )
         self.TTL = timedelta(minutes=5)
         self.inventory_dir = Path("inventory").resolve()
-        self._last_mtime = 0.0  # Guardaremos la última fecha de modificación conocida
-
-    def _get_max_mtime(self) -> float:
-        """Calcula la fecha de modificación más reciente de todo el inventario."""
-        max_mtime = 0.0
-        # Recorremos la carpeta inventory y sus subcarpetas (group_vars, etc)
-        for root, _, files in os.walk(self.inventory_dir):
-            for f in files:
-                if f.endswith((".yml", ".yaml")):
-                    mtime = os.path.getmtime(os.path.join(root, f))
-                    if mtime > max_mtime:
-                        max_mtime = mtime
-        return max_mtime
+        self._loader = InventoryLoader(str(self.inventory_dir))
+        self._watcher: Optional[InventoryWatcher] = None
+        # Snapshot compartido entre workers (None = cada proceso carga el suyo)
+        self.shared: Optional[SharedSnapshotStore] = None
+        self._shared_task: Optional[asyncio.Task] = None
+        # Índices de hashes de archivos servidos (se construyen en warm_up)
+        self.scripts_index = FileHashIndex("files/scripts")
+        self.skels_index = FileHashIndex("files/skels")
+        self.certs_index = FileHashIndex("files/certs")
+        # Lista blanca y cuerpos en memoria de las rutas de archivos
+        self.static = StaticFiles(
+            {"scripts": self.scripts_index, "skels": self.skels_index, "certs": self.certs_index},
+            get_settings().nexus_static_cache_bytes,
+            get_settings().nexus_static_max_file_bytes,
+        )
+        self._files_watcher: Optional[InventoryWatcher] = None
+        # Caché de scripts renderizados: hostname -> (clave, script, etag)
+        self._script_cache: Dict[str, Tuple[str, str, str]] = {}
+        # task_path -> nombre de la plantilla cargada (para su checksum)
+        self._template_names: Dict[str, str] = {}
+        self.script_cache_hits = 0
+        self.script_cache_misses = 0
+        # Fragmentos renderizados compartidos entre hosts (0 = desactivado)
+        fragment_bytes = get_settings().nexus_fragment_cache_bytes
+        self.fragments = FragmentMemo(fragment_bytes) if fragment_bytes > 0 else None
+
+    def warm_up(self):
+        """Fase de arranque: indexa los archivos servidos una sola vez."""
+        for index in (self.scripts_index, self.skels_index, self.certs_index):
+            index.scan()
+
+    async def precompile_templates(self) -> List[str]:
+        """
+        Fase de arranque: compila todas las plantillas referenciadas por algún
+        nexus_workflow (más las base). Si alguna falla, aborta con un informe.
+        """
+        start = time.perf_counter()
+        snapshot = await self.get_snapshot()
+
+        # Plantilla -> hosts que la usan (para que el informe diga a quién afecta)
+        users: Dict[str, List[str]] = {t: [] for t in self.BASE_TEMPLATES}
+        for hostname, host_vars in snapshot.hostvars.items():
+            for task_path in host_vars.get("nexus_workflow", []):
+                users.setdefault(task_path, []).append(hostname)
+
+        failures = []
+        for task_path in sorted(users):
+            try:
+                self._safe_get_template(task_path)
+            except (SecurityError, RenderingError, exceptions.TemplateError) as e:
+                hosts = ", ".join(users[task_path]) or "base"
+                failures.append(f"{task_path} ({hosts}): {e}")
+
+        elapsed = (time.perf_counter() - start) * 1000
+        if failures:
+            for line in failures:
+                logger.error(f"Template precompile failed: {line}")
+            raise RenderingError(
+                f"{len(failures)} of {len(users)} templates failed to compile:\n  "
+                + "\n  ".join(failures)
+            )
+        logger.info(f"Precompiled {len(users)} templates in {elapsed:.1f}ms")
+        return sorted(users)
+
+    def file_index_stats(self) -> Dict[str, Dict[str, int]]:
+        """Contadores de aciertos/fallos de los índices de hashes."""
+        return {
+            "scripts": self.scripts_index.stats(),
+            "skels": self.skels_index.stats(),
+            "certs": self.certs_index.stats(),
+        }
+
+    def fragment_cache_stats(self) -> Dict[str, Any]:
+        """Ocupación del memo de fragmentos y tasa de aciertos por plantilla."""
+        return self.fragments.stats() if self.fragments else {}
+
+    def _render_fragment(self, template, node_data: Mapping[str, Any]) -> str:
+        with template_render_seconds.time(template=template.name):
+            if self.fragments is None:
+                return template.render(node=node_data)
+            return self.fragments.render(template, node_data)
 
     async def _fetch_inventory(self) -> Dict[str, Any]:
+        if get_settings().nexus_inventory_loader == "ansible":
+            return await self._fetch_inventory_ansible()
+        # Cargador en proceso: fuera del event loop, solo re-parsea lo modificado
+        return await asyncio.to_thread(self._loader.load)
+
+    async def _fetch_inventory_ansible(self) -> Dict[str, Any]:
+        """Modo de respaldo: `ansible-inventory --list` como subproceso."""
         cmd = [
             "ansible-inventory",
             "-i",
@@ -66,65 +187,304 @@ class NexusEngine:
         return json.loads(stdout.decode())
 
     def _get_file_hash(self, filename: str) -> str:
-        """Calcula el MD5 de un script físico en el servidor."""
-        path = Path("files/scripts") / filename
-        if not path.exists():
-            return ""
-        return hashlib.md5(path.read_bytes()).hexdigest()
+        """MD5 de un script físico en el servidor (vía índice)."""
+        return self.scripts_index.get(filename)
 
     def _get_skel_hash(self, filename: str) -> str:
-        path = Path("files/skels") / filename
-        if not path.exists():
-            return ""
-        return hashlib.md5(path.read_bytes()).hexdigest()
+        return self.skels_index.get(filename)
 
     def _get_cert_hash(self, domain: str, filename: str) -> str:
-        path = Path("files/certs") / domain / filename
-        return hashlib.md5(path.read_bytes()).hexdigest() if path.exists() else ""
+        return self.certs_index.get(f"{domain}/{filename}")
+
+    @property
+    def generation(self) -> int:
+        """Generación de la recarga vigente (+1 en cada recarga completada)."""
+        return self._snapshot.generation if self._snapshot else 0
+
+    @property
+    def host_count(self) -> int:
+        return len(self._snapshot.hostvars) if self._snapshot else 0
+
+    @property
+    def duplicate_nexus_ids(self) -> Mapping[str, List[str]]:
+        return self._snapshot.duplicate_nexus_ids if self._snapshot else {}
+
+    @property
+    def is_follower(self) -> bool:
+        """Worker que adopta los snapshots publicados en vez de cargar el inventario."""
+        return self.shared is not None and not self.shared.is_owner
+
+    def _is_stale(self, snapshot: InventorySnapshot) -> bool:
+        # El TTL de un seguidor lo vigila el propietario
+        if self.is_follower:
+            return False
+        return datetime.now() - snapshot.loaded_at > self.TTL
+
+    def _install_snapshot(self, snapshot: InventorySnapshot):
+        diff = snapshot.diff
+        current = self._snapshot
+        if diff is not None and current is not None and diff.from_generation == current.generation:
+            # Invalidación dirigida: solo los hosts que el diff toca pierden su
+            # script; el resto (y sus digests, heredados en el snapshot) siguen
+            stale = diff.hosts
+            self._script_cache = {
+                h: v for h, v in self._script_cache.items() if h not in stale
+            }
+            self._record_changes(diff)
+        else:
+            # Carga completa: descartamos scripts de hosts que ya no existen
+            self._script_cache = {
+                h: v for h, v in self._script_cache.items() if h in snapshot.hostvars
+            }
+        # Intercambio atómico: los lectores ven el snapshot anterior o el nuevo
+        self._snapshot = snapshot
+
+    def _record_changes(self, diff: InventoryDiff):
+        self._changes.append(diff)
+        for change, count in (
+            ("added", len(diff.added)),
+            ("removed", len(diff.removed)),
+            ("changed", len(diff.changed)),
+        ):
+            if count:
+                inventory_changes_total.inc(count, change=change)
+        if diff.empty:
+            logger.info(f"Inventory generation {diff.to_generation}: no changes")
+        else:
+            logger.info(
+                f"Inventory generation {diff.to_generation}: {len(diff.changed)} changed, "
+                f"{len(diff.added)} added, {len(diff.removed)} removed"
+            )
+
+    def changes_since(self, generation: int) -> Dict[str, Any]:
+        """
+        Hosts tocados desde `generation` (excluida), con las claves cambiadas.
+        `complete` es False si el historial ya no llega hasta esa generación.
+        """
+        diffs = [d for d in self._changes if d.to_generation > generation]
+        hosts: Dict[str, Set[str]] = {}
+        for diff in diffs:
+            for hostname, keys in diff.changed.items():
+                hosts.setdefault(hostname, set()).update(keys)
+            for hostname in diff.added + diff.removed:
+                hosts.setdefault(hostname, set())
+        current = self._snapshot
+        return {
+            "generation": self.generation,
+            "since": generation,
+            "complete": generation >= self.generation
+            or bool(diffs and diffs[0].from_generation <= generation),
+            "hosts": {
+                h: {
+                    "present": current is not None and h in current.hostvars,
+                    "keys": sorted(keys),
+                }
+                for h, keys in sorted(hosts.items())
+            },
+            "diffs": [d.as_dict() for d in diffs],
+        }
 
     async def refresh_cache(self, force: bool = False):
         async with self._lock:
-            now = datetime.now()
-            current_max_mtime = self._get_max_mtime()
-
             # Decidimos si refrescar basándonos en:
-            # 1. Flag forzado
+            # 1. Flag forzado (recarga manual o evento del watcher de inventario)
             # 2. Caché vacía
             # 3. Han pasado 5 minutos (TTL)
-            # 4. NUEVO: Los archivos físicos son más nuevos que nuestra última carga
-            should_reload = (
-                force
-                or not self._inventory_cache
-                or self._last_update is None
-                or (now - self._last_update > self.TTL)
-                or (current_max_mtime > self._last_mtime)
+            current = self._snapshot
+            should_reload = force or current is None or self._is_stale(current)
+            if not should_reload:
+                return
+
+            if self.is_follower:
+                # Recarga el propietario; aquí solo adoptamos lo que publique.
+                # Sin nada publicado todavía, carga local (sin publicar).
+                if force:
+                    self.shared.request_reload()
+                    await self._wait_for_publish()
+                if await self._adopt_shared() or self._snapshot is not None:
+                    return
+
+            logger.info("Inventory change or TTL detected. Refreshing cache...")
+            with inventory_fetch_seconds.time():
+                data = await self._fetch_inventory()
+            generation = current.generation + 1 if current else 1
+            snapshot = InventorySnapshot.build(generation, data, current)
+            self._install_snapshot(snapshot)
+            logger.info(f"Inventory cache updated. Generation: {generation}")
+
+            if self.shared is not None and self.shared.is_owner:
+                try:
+                    await asyncio.to_thread(self.shared.publish, snapshot)
+                except OSError as e:
+                    logger.error(f"Could not publish shared snapshot: {e}")
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh_cache()
+        except Exception as e:
+            logger.error(f"Background inventory refresh failed: {e}")
+
+    async def get_snapshot(self) -> InventorySnapshot:
+        """
+        Snapshot vigente. Si venció el TTL se sigue sirviendo el actual
+        (stale-while-revalidate) mientras una única tarea lo reconstruye.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            await self.refresh_cache()
+            return self._snapshot
+        if self._is_stale(snapshot) and (
+            self._refresh_task is None or self._refresh_task.done()
+        ):
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+        return snapshot
+
+    # --- Snapshot compartido entre workers ---
+
+    async def start_shared(self):
+        """
+        Arranque: sirve el último snapshot publicado (arranque en caliente) y
+        elige propietario. El propietario recarga en segundo plano y publica;
+        el resto sondea el archivo y adopta cada generación nueva.
+        """
+        settings = get_settings()
+        if not settings.nexus_shared_snapshot:
+            return
+        store = SharedSnapshotStore(settings.nexus_shared_snapshot_path)
+        if not await asyncio.to_thread(store.available):
+            return
+        self.shared = store
+        store.try_acquire()
+
+        snapshot = await asyncio.to_thread(store.read)
+        if snapshot is not None:
+            self._install_snapshot(snapshot)
+            logger.info(
+                f"Warm start from shared snapshot: generation {snapshot.generation}, "
+                f"{len(snapshot.hostvars)} hosts"
             )
+            if store.is_owner:
+                self._refresh_task = asyncio.create_task(self._forced_refresh())
+        self._shared_task = asyncio.create_task(self._shared_loop())
+
+    async def stop_shared(self):
+        if self._shared_task:
+            self._shared_task.cancel()
+            try:
+                await self._shared_task
+            except asyncio.CancelledError:
+                pass
+            self._shared_task = None
+        if self.shared:
+            self.shared.release()
+
+    async def _forced_refresh(self):
+        try:
+            await self.refresh_cache(force=True)
+        except Exception as e:
+            logger.error(f"Inventory refresh failed: {e}")
+
+    async def _wait_for_publish(self, timeout: float = 10.0):
+        """Espera (acotada) a que el propietario publique tras pedirle recarga."""
+        deadline = time.monotonic() + timeout
+        while not self.shared.changed() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def _adopt_shared(self) -> bool:
+        """Adopta el snapshot publicado si cambió desde la última lectura."""
+        if not self.shared.changed():
+            return False
+        snapshot = await asyncio.to_thread(self.shared.read, self._snapshot)
+        if snapshot is None:
+            return False
+        self._install_snapshot(snapshot)
+        logger.info(f"Adopted shared inventory generation {snapshot.generation}")
+        return True
+
+    async def _shared_loop(self):
+        interval = get_settings().nexus_shared_poll_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.shared.is_owner:
+                    # Recargas pedidas por seguidores y TTL sin tráfico propio
+                    requested = self.shared.take_reload_request()
+                    if requested or self._snapshot is None or self._is_stale(self._snapshot):
+                        await self.refresh_cache(force=True)
+                elif self.shared.try_acquire():
+                    # El propietario anterior terminó: tomamos el relevo
+                    logger.warning("Took over inventory ownership")
+                    self.start_watcher()
+                    await self.refresh_cache(force=True)
+                else:
+                    async with self._lock:
+                        await self._adopt_shared()
+            except Exception as e:
+                logger.error(f"Shared snapshot loop error: {e}")
+
+    def start_watcher(self):
+        """Arranca el watcher de inventory/ (inotify con respaldo por sondeo)."""
+        if self.is_follower:
+            return  # Solo el propietario vigila inventory/
+        settings = get_settings()
+        self._watcher = InventoryWatcher(
+            [self.inventory_dir],
+            self._on_inventory_change,
+            mode=settings.nexus_watch_mode,
+            debounce_ms=settings.nexus_watch_debounce_ms,
+            poll_interval=settings.nexus_watch_poll_interval,
+        )
+        self._watcher.start()
+
+    async def stop_watcher(self):
+        if self._watcher:
+            await self._watcher.stop()
+            self._watcher = None
+        if self._files_watcher:
+            await self._files_watcher.stop()
+            self._files_watcher = None
+
+    def start_file_watcher(self):
+        """
+        Lista blanca de files/ (con precarga) y un watcher que la rehace en
+        cada cambio. Corre en todos los workers: cada uno sirve de su memoria.
+        """
+        self.static.scan()
+        files_dir = Path("files").resolve()
+        if not files_dir.is_dir():
+            return
+        settings = get_settings()
+        self._files_watcher = InventoryWatcher(
+            [files_dir],
+            self._on_files_change,
+            mode=settings.nexus_watch_mode,
+            debounce_ms=settings.nexus_watch_debounce_ms,
+            poll_interval=settings.nexus_watch_poll_interval,
+            watch_filter=is_served,
+            name="Files",
+        )
+        self._files_watcher.start()
 
-            if should_reload:
-                logger.info("Inventory change or TTL detected. Refreshing cache...")
-                data = await self._fetch_inventory()
-                self._inventory_cache = data.get("_meta", {}).get("hostvars", {})
-                # NUEVO: Guardamos las variables globales (grupo 'all') para el bootstrap
-                self._all_vars = data.get("all", {}).get("vars", {})
-                self._last_update = now
-                self._last_mtime = (
-                    current_max_mtime  # Guardamos la nueva marca de tiempo
-                )
-                logger.info(f"Inventory cache updated. New marker: {self._last_mtime}")
+    async def _on_files_change(self, changed: Set[str]):
+        logger.info(f"Served files changed ({len(changed)} paths)")
+        await asyncio.to_thread(self.static.scan)
+
+    async def _on_inventory_change(self, changed: Set[str]):
+        """Una sola recarga por lote de cambios (ya agrupado por el watcher)."""
+        logger.info(f"Inventory change detected ({len(changed)} paths)")
+        await self.refresh_cache(force=True)
 
     # NUEVO: Método para que main.py obtenga la red del YAML
-    async def get_all_vars(self) -> Dict[str, Any]:
+    async def get_all_vars(self) -> Mapping[str, Any]:
         """Retorna las variables globales del inventario (grupo all)."""
-        if not self._inventory_cache:
-            await self.refresh_cache()
-        return getattr(self, "_all_vars", {})
+        snapshot = await self.get_snapshot()
+        return snapshot.all_vars
 
-    async def get_node_data(self, hostname: str) -> Dict[str, Any]:
-        """Acceso público a los datos de un nodo en el inventario."""
-        if not self._inventory_cache:
-            await self.refresh_cache()
+    async def get_node_data(self, hostname: str) -> Mapping[str, Any]:
+        """Acceso público (solo lectura) a los datos de un nodo en el inventario."""
+        snapshot = await self.get_snapshot()
 
-        node = self._inventory_cache.get(hostname)
+        node = snapshot.hostvars.get(hostname)
         if not node:
             raise InventoryError(f"Node {hostname} not found in inventory")
 
@@ -132,39 +492,8 @@ class NexusEngine:
 
     async def get_hostname_by_machine_id(self, machine_id: str) -> Optional[str]:
         """Busca en el inventario qué hostname tiene asignado un machine_id (nexus_id)."""
-        if not self._inventory_cache:
-            await self.refresh_cache()
-
-        # Iteramos por todos los hosts del inventario buscando la variable 'nexus_id'
-        for hostname, host_vars in self._inventory_cache.items():
-            if host_vars.get("nexus_id") == machine_id:
-                return hostname
-        return None
-
-    def _minify_script(self, content: str) -> str:
-        """Limpia el script de comentarios y líneas vacías para aligerarlo."""
-        lines = content.splitlines()
-        clean_lines = []
-
-        for i, line in enumerate(lines):
-            # 1. Preservar la primera línea (Shebang) siempre
-            if i == 0 and line.startswith("#!"):
-                clean_lines.append(line)
-                continue
-
-            # 2. Eliminar espacios en blanco a los lados
-            stripped = line.strip()
-
-            # 3. Saltar si la línea está vacía o es un comentario puro
-            # Explicación regex: Empieza por # y no es #!
-            if not stripped or (
-                stripped.startswith("#") and not stripped.startswith("#!")
-            ):
-                continue
-
-            clean_lines.append(stripped)
-
-        return "\n".join(clean_lines)
+        snapshot = await self.get_snapshot()
+        return snapshot.machine_index.get(machine_id)
 
     def _safe_get_template(self, task_path: str):
         """Validación de seguridad contra Path Traversal y carga de plantilla."""
@@ -176,20 +505,132 @@ class NexusEngine:
                 raise SecurityError(f"Path Injection Attempt: {task_path}")
 
             rel_path = resolved_path.relative_to(self.template_base)
-            return self.jinja_env.get_template(str(rel_path))
+            template = self.jinja_env.get_template(str(rel_path))
+            self._template_names[task_path] = template.name
+            return template
         except (FileNotFoundError, RuntimeError):
             raise RenderingError(f"Task template missing or insecure: {task_path}")
 
     async def assemble_script(self, hostname: str) -> str:
         """Ensambla el script de configuración completo de forma atómica y segura."""
-        if not self._inventory_cache:
-            await self.refresh_cache()
-
-        # 1. Obtener datos del nodo desde la caché de inventario
-        node_data = self._inventory_cache.get(hostname)
-        if not node_data:
+        snapshot = await self.get_snapshot()
+        node_data = self._prepare_node(snapshot, hostname)
+        return self._render_node(hostname, node_data)
+
+    async def render_task(self, hostname: str) -> Tuple[str, str]:
+        """
+        Script final + ETag fuerte. Si la clave de caché del host (hostvars,
+        fuente compilado de las plantillas y hashes de archivos) no cambió,
+        no se renderiza.
+        """
+        snapshot = await self.get_snapshot()
+        node_data = self._prepare_node(snapshot, hostname)
+        cache_key = self._script_cache_key(snapshot, hostname, node_data)
+
+        cached = self._script_cache.get(hostname)
+        if cached and cached[0] == cache_key:
+            self.script_cache_hits += 1
+            return cached[1], cached[2]
+
+        self.script_cache_misses += 1
+        script = self._render_node(hostname, node_data)
+        return script, self._store_script(hostname, cache_key, script)
+
+    def _store_script(self, hostname: str, cache_key: str, script: str) -> str:
+        etag = f'"{hashlib.sha256(script.encode()).hexdigest()}"'
+        self._script_cache[hostname] = (cache_key, script, etag)
+        return etag
+
+    def is_cached(self, hostname: str, cache_key: str) -> bool:
+        """¿Ya hay un script en caché para esta clave? (pre-render incremental)"""
+        cached = self._script_cache.get(hostname)
+        return cached is not None and cached[0] == cache_key
+
+    def script_cache_key(self, snapshot: InventorySnapshot, hostname: str) -> str:
+        """Clave de caché de un host en un snapshot dado (ver _script_cache_key)."""
+        node_data = self._prepare_node(snapshot, hostname)
+        return self._script_cache_key(snapshot, hostname, node_data)
+
+    async def config_digest(self, hostname: str) -> str:
+        """
+        Digest de configuración para /get-version: la clave de caché del script
+        (hostvars, plantillas y hashes de archivos). No incluye la generación:
+        una recarga que no toca a este host no debe hacerle re-ejecutar.
+        """
+        snapshot = await self.get_snapshot()
+        return self.script_cache_key(snapshot, hostname)
+
+    def render_for(
+        self,
+        snapshot: InventorySnapshot,
+        hostname: str,
+        timings: Optional[List[Tuple[str, float]]] = None,
+    ) -> str:
+        """Renderizado síncrono contra un snapshot dado (pre-render de la flota)."""
+        node_data = self._prepare_node(snapshot, hostname)
+        return self._render_node(hostname, node_data, timings)
+
+    def install_script(
+        self, snapshot: InventorySnapshot, hostname: str, cache_key: str, script: str
+    ) -> Optional[str]:
+        """
+        Instala un script renderizado en otro proceso. Si entretanto hubo una
+        recarga de inventario no se instala nada (retorna None).
+        """
+        if snapshot is not self._snapshot:
+            return None
+        return self._store_script(hostname, cache_key, script)
+
+    async def get_manifest(self, hostname: str, kind: str) -> List[Mapping[str, Any]]:
+        """Manifiesto (scripts, skels o certs) tal y como lo ve assemble_script."""
+        snapshot = await self.get_snapshot()
+        node_data = self._prepare_node(snapshot, hostname)
+        return node_data[BUNDLE_KINDS[kind][0]]
+
+    def _template_checksums(self, workflow: Sequence[str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        Checksum del fuente que el entorno compiló para cada plantilla (no el
+        mtime del archivo: sin auto_reload, una edición no llega al render y
+        no debe cambiar el digest de /get-version). Sin stat por petición.
+        """
+        checksums = self.jinja_env.loader.checksums
+        result = []
+        for task_path in workflow:
+            name = self._template_names.get(task_path)
+            if name is None:
+                try:
+                    name = self._safe_get_template(task_path).name
+                except (SecurityError, RenderingError):
+                    result.append((task_path, None))  # El render fallará igualmente
+                    continue
+            result.append((task_path, checksums.get(name)))
+        return result
+
+    def _script_cache_key(
+        self, snapshot: InventorySnapshot, hostname: str, node_data: Mapping[str, Any]
+    ) -> str:
+        """Clave de caché: hostvars + fuente compilado de plantillas + hashes referenciados."""
+        material = {
+            "vars": snapshot.host_digest(hostname),
+            "key": node_data["nexus_api_key_scrambled"],
+            "templates": self._template_checksums(node_data.get("nexus_workflow", [])),
+            "scripts": node_data["script_manifest"],
+            "skels": node_data["skel_manifest"],
+            "certs": node_data["cert_manifest"],
+        }
+        with hash_seconds.time(kind="script_key"):
+            raw = json.dumps(thaw(material), sort_keys=True, default=str)
+            return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    def _overlay(snapshot: InventorySnapshot, hostname: str) -> ChainMap:
+        """
+        Vista por petición: los campos derivados van a un dict propio y el
+        snapshot compartido (solo lectura) queda debajo, sin mutarse.
+        """
+        host_vars = snapshot.hostvars.get(hostname)
+        if not host_vars:
             raise InventoryError(f"Node {hostname} not found in inventory")
-        node_data["hostname"] = hostname
 
         # 2. Gestión de Seguridad (Excepción por convenio: API KEY desde .env)
         settings = get_settings()
@@ -200,9 +641,16 @@ class NexusEngine:
         # 2. La codificamos en Base64 y le damos la vuelta (reverse)
         # [::-1] es el truco de Python para invertir un string
         # Inyectamos la clave ofuscada en lugar de la real
-        node_data["nexus_api_key_scrambled"] = base64.b64encode(
-            raw_key.encode()
-        ).decode()[::-1]
+        overlay = {
+            "hostname": hostname,
+            "nexus_api_key_scrambled": base64.b64encode(raw_key.encode()).decode()[::-1],
+        }
+        return ChainMap(overlay, host_vars)
+
+    def _prepare_node(self, snapshot: InventorySnapshot, hostname: str) -> ChainMap:
+        """Obtiene las hostvars del nodo e inyecta clave ofuscada y manifiestos."""
+        # 1. Obtener datos del nodo desde el snapshot de inventario
+        node_data = self._overlay(snapshot, hostname)
 
         # 3. Procesar Manifiesto de SCRIPTS (Tarea 06)
         raw_scripts = node_data.get("nexus_scripts", [])
@@ -284,48 +732,96 @@ class NexusEngine:
             cert_manifest.append(entry)
         node_data["cert_manifest"] = cert_manifest
 
+        # 6. Hueco de sondeo del agente (timer/cron de la Tarea 00)
+        interval = node_data.get("nexus_timer_interval", "30min")
+        node_data["nexus_schedule"] = poll_slot(hostname, interval).as_dict()
+        return node_data
+
+    def _load_workflow(self, hostname: str, node_data: Mapping[str, Any]) -> list:
+        """Fase de carga atómica: todas las plantillas del workflow o ninguna."""
         # 6. Fase de Carga Atómica del Workflow
         workflow = node_data.get("nexus_workflow", [])
         if not workflow:
             raise RenderingError(f"No workflow defined for {hostname}")
         try:
             # Validamos y cargamos todos los templates antes de renderizar nada
-            templates_to_render = [self._safe_get_template(t) for t in workflow]
+            return [self._safe_get_template(t) for t in workflow]
         except (SecurityError, RenderingError) as e:
             logger.error(f"Pipeline assembly abort for {hostname}: {e}")
             raise
 
-        # 7. Fase de Renderizado y Minificación Final
+    def _render_node(
+        self,
+        hostname: str,
+        node_data: Mapping[str, Any],
+        timings: Optional[List[Tuple[str, float]]] = None,
+    ) -> str:
+        """
+        Carga atómica del workflow y renderizado (las plantillas ya están
+        minificadas). Si se pasa `timings`, se anota (plantilla, ms) por fragmento.
+        """
+        templates_to_render = self._load_workflow(hostname, node_data)
+
+        # 7. Fase de Renderizado
         try:
-            # Renderizamos la unión de todos los fragmentos
-            full_script = "\n".join(
-                [t.render(node=node_data) for t in templates_to_render]
-            )
-            # Limpiamos comentarios y espacios para el cliente
-            return self._minify_script(full_script)
+            # Renderizamos la unión de todos los fragmentos (memoizados)
+            fragments = []
+            for t in templates_to_render:
+                start = time.perf_counter()
+                fragments.append(self._render_fragment(t, node_data))
+                if timings is not None:
+                    timings.append((t.name, (time.perf_counter() - start) * 1000))
+            return "\n".join(fragments)
+        except exceptions.UndefinedError as e:
+            logger.error(f"JINJA2 VARIABLE ERROR for {hostname}: {e}")
+            raise RenderingError(f"Missing variable in Vault or Inventory: {e}")
+
+    async def stream_task(self, hostname: str) -> Iterator[str]:
+        """
+        Modo streaming: mismo script que render_task, pero generado línea a
+        línea. Los errores se lanzan aquí, antes de enviar el primer byte.
+        La pasada en seco corre en un hilo, y StreamingResponse ya consume el
+        generador síncrono en el threadpool: ninguna pasada ocupa el event loop.
+        """
+        snapshot = await self.get_snapshot()
+        node_data = self._prepare_node(snapshot, hostname)
+        return await asyncio.to_thread(self._stream_node, hostname, node_data)
+
+    def _stream_node(self, hostname: str, node_data: Mapping[str, Any]) -> Iterator[str]:
+        templates_to_render = self._load_workflow(hostname, node_data)
+
+        # Pasada en seco: un StrictUndefined puede saltar en cualquier punto,
+        # así que recorremos la salida completa (descartándola) antes de
+        # comprometer la respuesta. Cuesta CPU, no memoria.
+        try:
+            for t in templates_to_render:
+                for _ in t.generate(node=node_data):
+                    pass
         except exceptions.UndefinedError as e:
             logger.error(f"JINJA2 VARIABLE ERROR for {hostname}: {e}")
             raise RenderingError(f"Missing variable in Vault or Inventory: {e}")
 
+        def fragments() -> Iterator[str]:
+            for i, t in enumerate(templates_to_render):
+                if i:
+                    yield "\n"
+                yield from t.generate(node=node_data)
+
+        return fragments()
+
     # --- Método de Purga actualizado ---
     async def assemble_purge_script(self, hostname: str) -> str:
         """Genera un script de limpieza total usando el ayudante seguro."""
-        node_data = await self.get_node_data(hostname)
-        node_data["hostname"] = hostname
-
-        # Inyectamos la clave para el reporte final de purga
-        settings = get_settings()
-        node_data["nexus_api_key_scrambled"] = base64.b64encode(
-            settings.nexus_api_key.encode()
-        ).decode()[::-1]
+        snapshot = await self.get_snapshot()
+        # La vista por petición ya inyecta hostname y la clave para el reporte final
+        node_data = self._overlay(snapshot, hostname)
 
         templates = [
             self._safe_get_template("base/header"),
             self._safe_get_template("base/purge"),
         ]
 
-        full_script = "\n".join([t.render(node=node_data) for t in templates])
-        return self._minify_script(full_script)
+        return "\n".join([t.render(node=node_data) for t in templates])
 
 
 nexus_engine = NexusEngine()
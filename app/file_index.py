@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from .metrics import hash_seconds
+
+logger = logging.getLogger("nexus.files")
+
+# Firma de un archivo físico: (size, mtime_ns, inode)
+FileSignature = Tuple[int, int, int]
+
+
+class FileHashIndex:
+    """Índice persistente de hashes MD5 para un directorio de archivos servidos."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = Path(base_dir)
+        self._entries: Dict[str, Tuple[FileSignature, str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> FileSignature:
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _hash_file(self, path: Path) -> str:
+        with hash_seconds.time(kind=self.base_dir.name):
+            h = hashlib.md5()
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 16), b""):
+                    h.update(chunk)
+            return h.hexdigest()
+
+    def scan(self) -> int:
+        """Construye el índice completo (arranque). Retorna el número de archivos."""
+        if not self.base_dir.is_dir():
+            return 0
+        count = 0
+        for root, _, files in os.walk(self.base_dir):
+            for f in files:
+                rel = os.path.relpath(os.path.join(root, f), self.base_dir)
+                if self.get(rel):
+                    count += 1
+        logger.info(f"File index {self.base_dir}: {count} files indexed")
+        return count
+
+    def get(self, rel_path: str) -> str:
+        """
+        Retorna el MD5 de base_dir/rel_path o "" si no existe.
+        Solo se vuelve a leer el archivo si su firma (size, mtime_ns, inode) cambió.
+        """
+        path = self.base_dir / rel_path
+        try:
+            st = path.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self._entries.pop(rel_path, None)
+            return ""
+
+        sig = self._signature(st)
+        entry = self._entries.get(rel_path)
+        if entry is not None and entry[0] == sig:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        try:
+            digest = self._hash_file(path)
+        except (IsADirectoryError, FileNotFoundError):
+            return ""
+        with self._lock:
+            self._entries[rel_path] = (sig, digest)
+        return digest
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
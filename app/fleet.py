@@ -0,0 +1,144 @@
+import base64
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+
+from .config import get_settings
+from .models import ONLINE_WINDOW, Machine, MachineReport, NodeStatus, engine
+
+# Columnas del listado: los blobs (last_log, report_data) nunca se cargan aquí
+LIST_FIELDS = (
+    "id",
+    "nodo",
+    "machine_id",
+    "fingerprint",
+    "status",
+    "ip",
+    "mac",
+    "vpn",
+    "via",
+    "fecha",
+)
+MAX_PAGE = 500
+
+
+def encode_cursor(fecha: datetime, machine_pk: int) -> str:
+    """Cursor opaco de paginación por clave: (fecha, id) de la última fila."""
+    raw = f"{fecha.isoformat()}|{machine_pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inversa de encode_cursor. ValueError si el cursor no es válido."""
+    try:
+        fecha, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(pk)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def list_page(
+    limit: int,
+    after: Optional[str] = None,
+    status: Optional[NodeStatus] = None,
+    online: Optional[bool] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Una página del listado, de la actividad más reciente a la más antigua.
+    Paginación por clave (fecha, id): el coste no crece con la profundidad.
+    """
+    table = Machine.__table__
+    wanted = [f for f in (fields or LIST_FIELDS) if f in LIST_FIELDS]
+    # fecha e id siempre: los necesita el cursor
+    columns = list(dict.fromkeys(wanted + ["fecha", "id"]))
+    statement = (
+        select(*(table.c[c] for c in columns))
+        .order_by(table.c.fecha.desc(), table.c.id.desc())
+        .limit(min(limit, MAX_PAGE) + 1)
+    )
+
+    if after:
+        fecha, pk = decode_cursor(after)
+        statement = statement.where(
+            (table.c.fecha < fecha) | ((table.c.fecha == fecha) & (table.c.id < pk))
+        )
+    if status is not None:
+        statement = statement.where(table.c.status == status)
+    if online is not None:
+        cutoff = datetime.now() - ONLINE_WINDOW
+        statement = statement.where(
+            table.c.fecha >= cutoff if online else table.c.fecha < cutoff
+        )
+
+    with engine.connect() as conn:
+        rows = conn.execute(statement).mappings().all()
+
+    has_more = len(rows) > min(limit, MAX_PAGE)
+    rows = rows[: min(limit, MAX_PAGE)]
+    cutoff = datetime.now() - ONLINE_WINDOW
+    items: List[Dict[str, Any]] = []
+    for row in rows:
+        item = {c: row[c] for c in wanted}
+        item["online"] = row["fecha"] >= cutoff
+        items.append(item)
+
+    next_cursor = encode_cursor(rows[-1]["fecha"], rows[-1]["id"]) if has_more else None
+    return {"items": items, "next": next_cursor}
+
+
+def machine_log(machine_id: str) -> Optional[Dict[str, Any]]:
+    """Blobs de un nodo (último log e informe), solo bajo demanda."""
+    table = Machine.__table__
+    reports = MachineReport.__table__
+    statement = (
+        select(table.c.nodo, reports.c.last_log, reports.c.report_data)
+        .select_from(
+            table.outerjoin(reports, reports.c.machine_id == table.c.machine_id)
+        )
+        .where(table.c.machine_id == machine_id)
+    )
+    with engine.connect() as conn:
+        row = conn.execute(statement).mappings().first()
+    return dict(row) if row else None
+
+
+class CountsCache:
+    """Recuentos por estado y online, recalculados como mucho cada `ttl` segundos."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value: Optional[Dict[str, int]] = None
+        self._at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, int]:
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._at < self.ttl:
+                return self._value
+            self._value = self._compute()
+            self._at = time.monotonic()
+            return self._value
+
+    @staticmethod
+    def _compute() -> Dict[str, int]:
+        table = Machine.__table__
+        counts = {s.value: 0 for s in NodeStatus}
+        cutoff = datetime.now() - ONLINE_WINDOW
+        with engine.connect() as conn:
+            for status, count in conn.execute(
+                select(table.c.status, func.count()).group_by(table.c.status)
+            ):
+                counts[NodeStatus(status).value] = count
+            online = conn.execute(
+                select(func.count()).where(table.c.fecha >= cutoff)
+            ).scalar_one()
+        counts["total"] = sum(counts[s.value] for s in NodeStatus)
+        counts["online"] = online
+        return counts
+
+
+status_counts = CountsCache(get_settings().nexus_status_counts_ttl)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, FrozenSet, Iterator, List, Mapping, Optional, Set
+
+from jinja2 import Template
+
+from .cache import ByteLRU
+from .snapshot import thaw
+
+logger = logging.getLogger("nexus.fragments")
+
+# Dependencias de un fragmento: claves de node leídas (None = el node entero)
+Deps = Optional[FrozenSet[str]]
+
+
+class TrackingMapping(Mapping):
+    """
+    Vista de `node` que anota qué claves lee una plantilla al renderizar.
+    Recorrerla entera (items(), for, length) cuenta como depender de todo.
+    """
+
+    __slots__ = ("_nexus_data", "_nexus_keys", "_nexus_whole")
+
+    def __init__(self, data: Mapping[str, Any]):
+        self._nexus_data = data
+        self._nexus_keys: Set[str] = set()
+        self._nexus_whole = False
+
+    def __getitem__(self, key: str) -> Any:
+        # También las claves ausentes: su ausencia forma parte del resultado
+        self._nexus_keys.add(key)
+        return self._nexus_data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        self._nexus_whole = True
+        return iter(self._nexus_data)
+
+    def __len__(self) -> int:
+        self._nexus_whole = True
+        return len(self._nexus_data)
+
+    @property
+    def deps(self) -> Deps:
+        return None if self._nexus_whole else frozenset(self._nexus_keys)
+
+
+def deps_digest(node: Mapping[str, Any], deps: Deps) -> str:
+    """Digest de los valores de node que afectan a un fragmento."""
+    keys = sorted(node) if deps is None else sorted(deps)
+    material = [[k, thaw(node[k])] if k in node else [k] for k in keys]
+    raw = json.dumps(material, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class FragmentMemo:
+    """
+    Memo de fragmentos renderizados compartido entre hosts.
+
+    La clave es (plantilla, claves leídas, digest de sus valores): si otro host
+    tiene los mismos valores en esas claves, el renderizado seguiría el mismo
+    camino y produciría el mismo texto. Como el conjunto de claves leídas
+    depende de las ramas tomadas, se guardan varias variantes por plantilla.
+    """
+
+    MAX_VARIANTS = 8
+
+    def __init__(self, max_bytes: int):
+        self.lru = ByteLRU(max_bytes)
+        self._variants: Dict[str, List[Deps]] = {}
+        self._stats: Dict[str, List[int]] = {}  # plantilla -> [hits, misses]
+        self._lock = threading.Lock()
+
+    def render(self, template: Template, node: Mapping[str, Any]) -> str:
+        name = template.name
+        stats = self._stats.setdefault(name, [0, 0])
+
+        for deps in list(self._variants.get(name, ())):
+            cached = self.lru.get((name, deps, deps_digest(node, deps)))
+            if cached is not None:
+                stats[0] += 1
+                return cached
+
+        stats[1] += 1
+        tracked = TrackingMapping(node)
+        output = template.render(node=tracked)
+        deps = tracked.deps
+
+        with self._lock:
+            variants = self._variants.setdefault(name, [])
+            if deps in variants:
+                variants.remove(deps)
+            variants.insert(0, deps)
+            del variants[self.MAX_VARIANTS :]
+        self.lru.put((name, deps, deps_digest(node, deps)), output, len(output.encode()))
+        return output
+
+    def stats(self) -> Dict[str, Any]:
+        templates = {}
+        for name, (hits, misses) in sorted(self._stats.items()):
+            total = hits + misses
+            templates[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "variants": len(self._variants.get(name, ())),
+            }
+        return {"cache": self.lru.stats(), "templates": templates}
@@ -0,0 +1,379 @@
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import re
+import subprocess
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from .exceptions import InventoryError
+
+logger = logging.getLogger("nexus.inventory")
+
+VAULT_HEADER = b"$ANSIBLE_VAULT"
+# Mismas extensiones que acepta el plugin host_group_vars de Ansible
+VARS_EXTENSIONS = ("", ".yml", ".yaml", ".json")
+# Rango de hosts estilo Ansible: web[01:10], db[a:c]
+HOST_RANGE = re.compile(r"^(.*?)\[([0-9a-zA-Z]+):([0-9a-zA-Z]+)(?::(\d+))?\](.*)$")
+
+
+# --- VAULT (formato $ANSIBLE_VAULT;1.1/1.2;AES256) ---
+
+
+def read_vault_password(path: Path) -> bytes:
+    """Lee la contraseña del Vault igual que Ansible (archivo o script ejecutable)."""
+    if not path.exists():
+        raise InventoryError(f"Vault password file not found: {path}")
+    if os.access(path, os.X_OK):
+        result = subprocess.run([str(path)], capture_output=True, check=False)
+        if result.returncode != 0:
+            raise InventoryError(f"Vault password script failed: {path}")
+        return result.stdout.strip(b"\r\n")
+    return path.read_bytes().strip(b"\r\n")
+
+
+def is_vault_data(data: bytes) -> bool:
+    return data.lstrip().startswith(VAULT_HEADER)
+
+
+def decrypt_vault(data: bytes, password: bytes) -> bytes:
+    """Descifra un payload de Ansible Vault (AES256, PBKDF2 + HMAC-SHA256)."""
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    lines = data.strip().splitlines()
+    header = lines[0].strip().split(b";")
+    if len(header) < 3 or header[2].strip() != b"AES256":
+        raise InventoryError("Unsupported vault format")
+
+    try:
+        vaulttext = binascii.unhexlify(b"".join(line.strip() for line in lines[1:]))
+        b_salt, b_hmac, b_ciphertext = vaulttext.split(b"\n", 2)
+        salt = binascii.unhexlify(b_salt)
+        ciphertext = binascii.unhexlify(b_ciphertext)
+    except (binascii.Error, ValueError):
+        raise InventoryError("Malformed vault payload")
+
+    derived = hashlib.pbkdf2_hmac("sha256", password, salt, 10000, dklen=80)
+    key1, key2, iv = derived[:32], derived[32:64], derived[64:80]
+
+    expected = hmac.new(key2, ciphertext, hashlib.sha256).hexdigest().encode()
+    if not hmac.compare_digest(expected, b_hmac.strip()):
+        raise InventoryError("Vault HMAC verification failed (wrong password?)")
+
+    decryptor = Cipher(algorithms.AES(key1), modes.CTR(iv)).decryptor()
+    unpadder = padding.PKCS7(128).unpadder()
+    padded = decryptor.update(ciphertext) + decryptor.finalize()
+    return unpadder.update(padded) + unpadder.finalize()
+
+
+# --- YAML (tags de Ansible y normalización a tipos JSON) ---
+
+
+def _make_yaml_loader(password: Optional[bytes]):
+    class NexusYamlLoader(yaml.SafeLoader):
+        pass
+
+    def _vault(loader, node):
+        ciphertext = loader.construct_scalar(node).encode()
+        if password is None:
+            raise InventoryError("Inline !vault value found but no vault password")
+        return decrypt_vault(ciphertext, password).decode()
+
+    def _unsafe(loader, node):
+        return loader.construct_scalar(node)
+
+    NexusYamlLoader.add_constructor("!vault", _vault)
+    NexusYamlLoader.add_constructor("!unsafe", _unsafe)
+    return NexusYamlLoader
+
+
+def _to_json_types(value: Any) -> Any:
+    """
+    Normaliza a los mismos tipos que produce `ansible-inventory --list`,
+    incluido el orden de claves (su salida JSON usa sort_keys).
+    """
+    if isinstance(value, dict):
+        return {str(k): _to_json_types(value[k]) for k in sorted(value, key=str)}
+    if isinstance(value, (list, tuple, set)):
+        return [_to_json_types(v) for v in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    return value
+
+
+def combine_vars(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """hash_behaviour=replace de Ansible: las claves de nivel superior se sustituyen."""
+    result = dict(a)
+    result.update(b)
+    return result
+
+
+# --- ESTRUCTURA DEL INVENTARIO (hosts.yml) ---
+
+
+class _Group:
+    def __init__(self, name: str):
+        self.name = name
+        self.vars: Dict[str, Any] = {}
+        self.hosts: List[str] = []
+        self.children: List[str] = []
+        self.parents: Set[str] = set()
+
+
+def _expand_host_pattern(pattern: str) -> List[Tuple[str, Optional[int]]]:
+    """Expande rangos (web[01:03]) y puertos (host:2222) como el plugin yaml."""
+    port = None
+    if pattern.count(":") == 1 and "[" not in pattern:
+        pattern, raw_port = pattern.split(":")
+        port = int(raw_port)
+
+    match = HOST_RANGE.match(pattern)
+    if not match:
+        return [(pattern, port)]
+
+    head, start, end, step, tail = match.groups()
+    step_n = int(step or 1)
+    if start.isdigit() and end.isdigit():
+        width = len(start) if start.startswith("0") else 0
+        values = [str(i).zfill(width) for i in range(int(start), int(end) + 1, step_n)]
+    else:
+        values = [chr(c) for c in range(ord(start), ord(end) + 1, step_n)]
+
+    expanded = []
+    for v in values:
+        expanded.extend(_expand_host_pattern(f"{head}{v}{tail}"))
+    return [(name, port if port is not None else p) for name, p in expanded]
+
+
+class InventoryLoader:
+    """
+    Cargador de inventario en proceso. Reproduce `ansible-inventory --list`
+    para el layout de inventory/: hosts.yml, group_vars/, host_vars/ y Vault.
+    Solo vuelve a leer (y descifrar) los archivos cuyo mtime cambió.
+    """
+
+    def __init__(
+        self,
+        inventory_dir: str = "inventory",
+        hosts_file: str = "hosts.yml",
+        vault_password_file: str = ".vault_pass",
+    ):
+        self.inventory_dir = Path(inventory_dir)
+        self.hosts_file = self.inventory_dir / hosts_file
+        self.vault_password_file = Path(vault_password_file)
+        self._password: Optional[bytes] = None
+        self._password_sig: Optional[Tuple[int, int]] = None
+        # Caché de archivos parseados: path -> ((mtime_ns, size), datos)
+        self._files: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self.parsed_files = 0
+
+    def _vault_password(self) -> Optional[bytes]:
+        try:
+            st = self.vault_password_file.stat()
+        except FileNotFoundError:
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig != self._password_sig:
+            self._password = read_vault_password(self.vault_password_file)
+            self._password_sig = sig
+            self._files.clear()  # Contraseña nueva: re-descifrar todo
+        return self._password
+
+    def _load_file(self, path: Path) -> Any:
+        key = str(path)
+        st = path.stat()
+        sig = (st.st_mtime_ns, st.st_size)
+        cached = self._files.get(key)
+        if cached and cached[0] == sig:
+            return cached[1]
+
+        raw = path.read_bytes()
+        password = self._vault_password()
+        if is_vault_data(raw):
+            if password is None:
+                raise InventoryError(f"{path} is vault-encrypted but no password found")
+            raw = decrypt_vault(raw, password)
+        try:
+            data = yaml.load(raw, Loader=_make_yaml_loader(password))
+        except yaml.YAMLError as e:
+            raise InventoryError(f"YAML error in {path}: {e}")
+
+        data = _to_json_types(data)
+        self._files[key] = (sig, data)
+        self.parsed_files += 1
+        return data
+
+    def _find_vars_files(self, base: Path, name: str) -> List[Path]:
+        for ext in VARS_EXTENSIONS:
+            candidate = base / f"{name}{ext}"
+            if candidate.is_dir():
+                return self._dir_vars_files(candidate)
+            if candidate.is_file():
+                return [candidate]
+        return []
+
+    def _dir_vars_files(self, path: Path) -> List[Path]:
+        found: List[Path] = []
+        for entry in sorted(os.listdir(path)):
+            if entry.startswith(".") or entry.endswith("~"):
+                continue
+            full = path / entry
+            ext = os.path.splitext(entry)[-1]
+            if full.is_dir() and not ext:
+                found.extend(self._dir_vars_files(full))
+            elif full.is_file() and (not ext or ext in VARS_EXTENSIONS):
+                found.append(full)
+        return found
+
+    def _entity_vars(self, kind: str, name: str) -> Dict[str, Any]:
+        """Variables de group_vars/<name> o host_vars/<name> (archivo o directorio)."""
+        result: Dict[str, Any] = {}
+        for path in self._find_vars_files(self.inventory_dir / kind, name):
+            data = self._load_file(path)
+            if data is None:
+                continue
+            if not isinstance(data, dict):
+                raise InventoryError(f"{path} must contain a mapping of variables")
+            result = combine_vars(result, data)
+        return result
+
+    def _parse_hosts(self) -> Tuple[Dict[str, _Group], Dict[str, Dict[str, Any]]]:
+        data = self._load_file(self.hosts_file) or {}
+        if not isinstance(data, dict):
+            raise InventoryError(f"{self.hosts_file} must be a mapping of groups")
+
+        groups: Dict[str, _Group] = {"all": _Group("all"), "ungrouped": _Group("ungrouped")}
+        host_vars: Dict[str, Dict[str, Any]] = {}
+
+        def get_group(name: str) -> _Group:
+            if name not in groups:
+                groups[name] = _Group(name)
+            return groups[name]
+
+        def parse_group(name: str, body: Any):
+            group = get_group(name)
+            if body is None:
+                return
+            if not isinstance(body, dict):
+                raise InventoryError(f"Invalid definition for group {name}")
+            group.vars = combine_vars(group.vars, body.get("vars") or {})
+            for pattern, hvars in (body.get("hosts") or {}).items():
+                for host, port in _expand_host_pattern(str(pattern)):
+                    current = host_vars.setdefault(host, {})
+                    current.update(hvars or {})
+                    if port is not None:
+                        current["ansible_port"] = port
+                    if host not in group.hosts:
+                        group.hosts.append(host)
+            for child, child_body in (body.get("children") or {}).items():
+                child_group = get_group(child)
+                child_group.parents.add(name)
+                if child not in group.children:
+                    group.children.append(child)
+                parse_group(child, child_body)
+
+        for name, body in data.items():
+            parse_group(name, body)
+            if name != "all":
+                groups[name].parents.add("all")
+                if name not in groups["all"].children:
+                    groups["all"].children.append(name)
+
+        # Los hosts definidos directamente bajo 'all' pertenecen a 'ungrouped'
+        all_group = groups["all"]
+        groups["ungrouped"].hosts.extend(all_group.hosts)
+        all_group.hosts = []
+        groups["ungrouped"].parents.add("all")
+        if "ungrouped" not in all_group.children:
+            all_group.children.append("ungrouped")
+
+        return groups, host_vars
+
+    @staticmethod
+    def _depths(groups: Dict[str, _Group]) -> Dict[str, int]:
+        depths: Dict[str, int] = {"all": 0}
+
+        def visit(name: str, depth: int, seen: Set[str]):
+            if name in seen:
+                raise InventoryError(f"Group cycle detected at {name}")
+            if depth < depths.get(name, -1):
+                return
+            depths[name] = depth
+            for child in groups[name].children:
+                visit(child, depth + 1, seen | {name})
+
+        visit("all", 0, set())
+        return depths
+
+    def load(self) -> Dict[str, Any]:
+        """Retorna la misma estructura que `ansible-inventory --list`."""
+        if not self.hosts_file.exists():
+            raise InventoryError(f"Inventory file not found: {self.hosts_file}")
+
+        groups, inline_host_vars = self._parse_hosts()
+        depths = self._depths(groups)
+
+        def ancestors(name: str) -> Set[str]:
+            result: Set[str] = set()
+            stack = [name]
+            while stack:
+                for parent in groups[stack.pop()].parents:
+                    if parent not in result:
+                        result.add(parent)
+                        stack.append(parent)
+            return result
+
+        # Grupos de cada host (directos + ancestros), ordenados como sort_groups()
+        host_groups: Dict[str, List[str]] = {}
+        for group in groups.values():
+            for host in group.hosts:
+                names = host_groups.setdefault(host, [])
+                for g in {group.name} | ancestors(group.name):
+                    if g != "all" and g not in names:
+                        names.append(g)
+        for names in host_groups.values():
+            names.sort(key=lambda g: (depths.get(g, 0), g))
+
+        group_files = {
+            name: self._entity_vars("group_vars", name)
+            for name in groups
+            if any(name in names for names in host_groups.values()) or name == "all"
+        }
+
+        all_vars = combine_vars(groups["all"].vars, group_files["all"])
+
+        hostvars: Dict[str, Dict[str, Any]] = {}
+        for host in sorted(host_groups):
+            names = host_groups[host]
+            merged = dict(groups["all"].vars)  # all_inventory
+            for g in names:  # groups_inventory
+                merged = combine_vars(merged, groups[g].vars)
+            merged = combine_vars(merged, group_files["all"])  # all_plugins_inventory
+            for g in names:  # groups_plugins_inventory
+                merged = combine_vars(merged, group_files[g])
+            merged = combine_vars(merged, inline_host_vars.get(host, {}))
+            merged = combine_vars(merged, self._entity_vars("host_vars", host))
+            hostvars[host] = dict(sorted(merged.items()))
+
+        result: Dict[str, Any] = {
+            "_meta": {"hostvars": hostvars},
+            "all": {"children": groups["all"].children, "vars": all_vars},
+        }
+        for name, group in groups.items():
+            if name == "all":
+                continue
+            entry: Dict[str, Any] = {}
+            if group.hosts:
+                entry["hosts"] = group.hosts
+            if group.children:
+                entry["children"] = group.children
+            result[name] = entry
+        return result
@@ -1,16 +1,35 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import PlainTextResponse, FileResponse
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse
 import logging
-from datetime import datetime
-from pathlib import Path
-import json
-
-from sqlmodel import Session, select, desc
-from .models import Machine, NodeStatus, engine
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from sqlmodel import Session, select
+from .models import Machine, NodeStatus, create_db_and_tables, engine, run_db
+from .bundle import BUNDLE_KINDS, parse_client_hashes, select_members, stream_tar
+from .compression import compressed_variants, variant_etag
+from .config import get_settings
 from .engine import nexus_engine
-from .exceptions import NexusError  # Usado en except para Ruff
+from .fleet import list_page, machine_log, status_counts
+from . import metrics
+from .metrics import (
+    MetricsMiddleware,
+    db_commit_seconds,
+    fingerprint_rejects_total,
+    not_modified_total,
+    purges_total,
+    version_checks_total,
+)
+from .prerender import prerender_and_warm
+from .profiling import ProfilingMiddleware, request_profiler
+from .scheduler import load_shedder
+from .exceptions import InventoryError, NexusError  # Usado en except para Ruff
 from .dependencies import verify_nexus_key, verify_dashboard_access
+from .telemetry import build_report, history, telemetry
 
 # Configurar motor de plantillas HTML
 templates_web = Jinja2Templates(directory="templates/web")
@@ -18,12 +37,164 @@ templates_web = Jinja2Templates(directory="templates/web")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("nexus.api")
 
-app = FastAPI(title="Esvibox Nexus API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arranque: indexamos una vez los archivos servidos (scripts, skels, certs)
+    # y compilamos las plantillas de todos los workflows antes de aceptar nodos
+    start = time.perf_counter()
+    # Crea las tablas nuevas (p. ej. el histórico) en bases de datos existentes
+    await run_db(create_db_and_tables)
+    nexus_engine.warm_up()
+    await nexus_engine.start_shared()
+    await nexus_engine.precompile_templates()
+    logger.info(f"Startup warm-up finished in {(time.perf_counter() - start):.2f}s")
+    nexus_engine.start_watcher()
+    nexus_engine.start_file_watcher()
+    telemetry.start()
+    history.start()
+    yield
+    # Apagado: primero vaciamos la cola de telemetría pendiente
+    await telemetry.stop()
+    await history.stop()
+    await nexus_engine.stop_watcher()
+    await nexus_engine.stop_shared()
+
+
+app = FastAPI(title="Esvibox Nexus API", lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+def _admission_query(machine_id: str):
+    """Fila de admisión (los blobs de telemetría viven en MachineReport)."""
+    return select(Machine).where(Machine.machine_id == machine_id)
+
+
+def admit_machine(
+    machine_id: str,
+    fingerprint: str,
+    real_hostname: Optional[str],
+    node_data: Mapping[str, Any],
+) -> str:
+    """
+    Admisión de /get-task contra la DB, con como mucho un commit.
+    Retorna: "unregistered", "pending", "purge", "bad_fingerprint" u "ok".
+    """
+    with Session(engine) as session:
+        db_machine = session.exec(_admission_query(machine_id)).first()
+
+        if not db_machine:
+            return "unregistered"
+
+        # 2. Auto-aprobación si el ID aparece en el YAML
+        if not real_hostname or db_machine.status != NodeStatus.approved:
+            return "pending"
+
+        # --- LÓGICA DE PURGA ---
+        if node_data.get("nexus_purge") is True:
+            # Marcamos en la DB como bloqueado para que no pueda pedir nada más
+            db_machine.status = NodeStatus.blocked
+            session.add(db_machine)
+            with db_commit_seconds.time(op="admission"):
+                session.commit()
+            return "purge"
+
+        # 5. Si no hay purga, asegurar que está aprobado para tareas normales
+        dirty = False
+        if db_machine.status != NodeStatus.approved:
+            # Si estaba blocked o pending pero el admin ya lo puso en YAML (y sin purge)
+            db_machine.status = NodeStatus.approved
+            db_machine.nodo = real_hostname
+            dirty = True
+
+        # 6. Validación de Huella y Force Enroll
+        outcome = "ok"
+        if db_machine.fingerprint != fingerprint:
+            if node_data.get("nexus_force_enroll", False):
+                db_machine.fingerprint = fingerprint
+                dirty = True
+            else:
+                outcome = "bad_fingerprint"
+
+        # Un único commit con todos los cambios de la petición
+        if dirty:
+            session.add(db_machine)
+            with db_commit_seconds.time(op="admission"):
+                session.commit()
+        return outcome
 
 
-def get_session():
+def peek_admission(
+    machine_id: str,
+    fingerprint: str,
+    real_hostname: Optional[str],
+    node_data: Mapping[str, Any],
+) -> str:
+    """
+    Misma decisión que admit_machine pero sin escribir nada: /get-version no
+    debe consumir una purga ni un force-enroll (eso lo hace /get-task).
+    Retorna: "unregistered", "pending", "purge", "enroll", "bad_fingerprint" u "ok".
+    """
     with Session(engine) as session:
-        yield session
+        db_machine = session.exec(_admission_query(machine_id)).first()
+
+    if not db_machine:
+        return "unregistered"
+    if not real_hostname or db_machine.status != NodeStatus.approved:
+        return "pending"
+    if node_data.get("nexus_purge") is True:
+        return "purge"
+    if db_machine.fingerprint != fingerprint:
+        return "enroll" if node_data.get("nexus_force_enroll", False) else "bad_fingerprint"
+    return "ok"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110) contra nuestro ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+async def served_file(
+    kind: str,
+    rel_path: str,
+    accept_encoding: Optional[str],
+    if_none_match: Optional[str],
+) -> Response:
+    """
+    Archivo estático desde la lista blanca en memoria: ETag por hash de
+    contenido, 304 si el cliente ya lo tiene y compresión una vez por hash.
+    Los aciertos se sirven en el event loop; la lectura de disco de un fallo
+    y la primera compresión de cada variante van a un hilo.
+    """
+    static = nexus_engine.static
+    entry = static.lookup(kind, rel_path)
+    if entry is None:
+        raise HTTPException(status_code=404)
+    body = static.cached(entry)
+    if body is None and entry.size <= static.max_file_bytes:
+        body = await asyncio.to_thread(static.body, entry)
+    # Los archivos grandes no se comprimen: irían enteros a memoria
+    encoding = compressed_variants.select(entry.size, accept_encoding) if body is not None else None
+    headers = {"ETag": variant_etag(entry.etag, encoding), "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        return FileResponse(entry.path, media_type=entry.media_type, headers=headers)
+    if encoding is not None:
+        raw = body
+        body = compressed_variants.cached(entry.content_hash, encoding)
+        if body is None:
+            body = await asyncio.to_thread(
+                compressed_variants.get, entry.content_hash, encoding, lambda: raw
+            )
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=entry.media_type, headers=headers)
 
 
 # --- RUTAS PÚBLICAS ---
@@ -35,16 +206,49 @@ async def root():
 
 
 @app.get("/status", dependencies=[Depends(verify_dashboard_access)])
-async def get_status_page(request: Request, session: Session = Depends(get_session)):
+async def get_status_page(request: Request):
     """
     Dashboard de estado. Ahora solo accesible desde IPs en la lista blanca.
     No requiere clave en la URL, solo estar en la red correcta.
+    La tabla se carga por páginas desde /api/machines.
     """
-    statement = select(Machine).order_by(desc(Machine.fecha))
-    machines = session.exec(statement).all()
-    return templates_web.TemplateResponse(
-        "status.html", {"request": request, "machines": machines}
-    )
+    return templates_web.TemplateResponse("status.html", {"request": request})
+
+
+@app.get("/api/machines", dependencies=[Depends(verify_dashboard_access)])
+async def api_list_machines(
+    limit: int = 100,
+    after: Optional[str] = None,
+    status: Optional[NodeStatus] = None,
+    online: Optional[bool] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Listado paginado de la flota (sin blobs). `after` es el cursor `next` de
+    la página anterior; `fields` limita las columnas (separadas por comas).
+    """
+    try:
+        page = await run_db(
+            list_page,
+            max(limit, 1),
+            after,
+            status,
+            online,
+            fields.split(",") if fields else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page["counts"] = await run_db(status_counts.get)
+    return page
+
+
+@app.get("/api/machines/{machine_id}/log", dependencies=[Depends(verify_dashboard_access)])
+async def api_machine_log(machine_id: str):
+    """Último log e informe de un nodo (se piden al abrir el detalle)."""
+    data = await run_db(machine_log, machine_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+    return data
 
 
 @app.get("/bootstrap", response_class=PlainTextResponse)
@@ -71,75 +275,138 @@ async def get_bootstrap(request: Request):
 # --- RUTAS PROTEGIDAS ---
 
 
+def _telemetry_saturated() -> bool:
+    """La cola de /record está casi llena: mejor pedir al agente que vuelva luego."""
+    return telemetry.stats()["queue_depth"] >= get_settings().nexus_record_queue_max * 0.8
+
+
 @app.get(
     "/get-task/{hostname}",
     response_class=PlainTextResponse,
-    dependencies=[Depends(verify_nexus_key)],
+    dependencies=[Depends(verify_nexus_key), Depends(load_shedder.guard())],
 )
 async def get_task(
     hostname: str,
     machine_id: str,
     fingerprint: str,
-    session: Session = Depends(get_session),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
 ):
-    # 1. Identificar la máquina (YAML + DB)
+    # 0. Un /record de esta máquina aún en cola (bootstrap: record + get-task
+    # seguidos) debe estar escrito antes de consultar la DB
+    if telemetry.is_pending(machine_id):
+        await telemetry.flush()
+
+    # 1. Identificar la máquina (YAML); los datos del nodo se leen antes de
+    # pasar a la DB para resolver la admisión en una sola visita al pool
     real_hostname = await nexus_engine.get_hostname_by_machine_id(machine_id)
-    statement = select(Machine).where(Machine.machine_id == machine_id)
-    db_machine = session.exec(statement).first()
+    node_data = await nexus_engine.get_node_data(real_hostname) if real_hostname else {}
 
-    if not db_machine:
-        raise HTTPException(status_code=403, detail="Machine not registered.")
+    # 2-6. Registro, aprobación, purga y huella (DB, un solo commit)
+    outcome = await run_db(admit_machine, machine_id, fingerprint, real_hostname, node_data)
 
-    # 2. Auto-aprobación si el ID aparece en el YAML
-    if not real_hostname or db_machine.status != NodeStatus.approved:
+    if outcome == "unregistered":
+        raise HTTPException(status_code=403, detail="Machine not registered.")
+    if outcome == "pending":
         return "# Nexus: Node pending or not in inventory.\nexit 0"
-
-    # 3. Validación de existencia en Inventario
-    if real_hostname is None:
-        return "# Nexus: Node not in inventory.\nexit 0"
-
-    # 4. Obtener datos del nodo del Inventario
-    node_data = await nexus_engine.get_node_data(real_hostname)
-
-    # --- NUEVA LÓGICA DE PURGA (Añadir aquí) ---
-    if node_data.get("nexus_purge") is True:
+    if outcome == "purge":
+        purges_total.inc()
         logger.warning(f"!!! PURGE ORDERED for {real_hostname} !!!")
-        # Marcamos en la DB como bloqueado para que no pueda pedir nada más
-        db_machine.status = NodeStatus.blocked
-        session.add(db_machine)
-        session.commit()
         # Entregamos el script de limpieza total en lugar del normal
         return await nexus_engine.assemble_purge_script(real_hostname)
-    # --------------------------------------------
-
-    # 5. Si no hay purga, asegurar que está aprobado para tareas normales
-    if db_machine.status != NodeStatus.approved:
-        # Si estaba blocked o pending pero el admin ya lo puso en YAML (y sin purge)
-        db_machine.status = NodeStatus.approved
-        db_machine.nodo = real_hostname
-        session.add(db_machine)
-        session.commit()
-
-    # 6. Validación de Huella y Force Enroll
-    force_enroll = node_data.get("nexus_force_enroll", False)
-    if db_machine.fingerprint != fingerprint:
-        if force_enroll:
-            db_machine.fingerprint = fingerprint
-            session.add(db_machine)
-            session.commit()
-        else:
-            raise HTTPException(status_code=403, detail="Invalid hardware fingerprint.")
-
-    # 7. Entrega del script de orquestación normal
+    if outcome == "bad_fingerprint":
+        fingerprint_rejects_total.inc()
+        raise HTTPException(status_code=403, detail="Invalid hardware fingerprint.")
+
+    # 7a. Modo streaming: el script se valida entero y luego sale línea a línea
+    if get_settings().nexus_render_mode == "stream":
+        try:
+            lines = await nexus_engine.stream_task(real_hostname)
+        except NexusError as e:
+            logger.error(f"Nexus task error for {real_hostname}: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        return StreamingResponse(
+            lines,
+            media_type="text/plain",
+            headers={"X-Nexus-Generation": str(nexus_engine.generation)},
+        )
+
+    # 7. Entrega del script de orquestación normal (cacheado por host)
     try:
-        return await nexus_engine.assemble_script(real_hostname)
+        script, etag = await nexus_engine.render_task(real_hostname)
     except NexusError as e:
         logger.error(f"Nexus task error for {real_hostname}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    # 8. Representación negociada: cada codificación lleva su propio ETag
+    encoding = compressed_variants.select(len(script), accept_encoding)
+    headers = {
+        "ETag": variant_etag(etag, encoding),
+        "Vary": "Accept-Encoding",
+        "X-Nexus-Generation": str(nexus_engine.generation),
+    }
+
+    # 9. El agente ya tiene esta versión: 304 sin cuerpo
+    if etag_matches(if_none_match, headers["ETag"]):
+        not_modified_total.inc()
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return PlainTextResponse(script, headers=headers)
+    # Como en served_file: la primera compresión de cada variante, en un hilo
+    content_hash = etag.strip('"')
+    body = compressed_variants.cached(content_hash, encoding)
+    if body is None:
+        body = await asyncio.to_thread(
+            compressed_variants.get, content_hash, encoding, script.encode
+        )
+    headers["Content-Encoding"] = encoding
+    return Response(body, media_type="text/plain; charset=utf-8", headers=headers)
+
+
+@app.get(
+    "/get-version/{hostname}",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verify_nexus_key)],
+)
+async def get_version(hostname: str, machine_id: str, fingerprint: str):
+    """
+    Digest de la configuración del nodo: el agente solo descarga y ejecuta
+    /get-task cuando cambia. Los estados sin script normal (pending, purga,
+    force-enroll) devuelven un centinela fijo para que el agente pase igualmente
+    por /get-task y este aplique la transición.
+    """
+    if telemetry.is_pending(machine_id):
+        await telemetry.flush()
+
+    real_hostname = await nexus_engine.get_hostname_by_machine_id(machine_id)
+    node_data = await nexus_engine.get_node_data(real_hostname) if real_hostname else {}
+    outcome = await run_db(peek_admission, machine_id, fingerprint, real_hostname, node_data)
+
+    if outcome == "unregistered":
+        raise HTTPException(status_code=403, detail="Machine not registered.")
+    if outcome == "bad_fingerprint":
+        fingerprint_rejects_total.inc()
+        raise HTTPException(status_code=403, detail="Invalid hardware fingerprint.")
+    version_checks_total.inc(state=outcome)
+    if outcome != "ok":
+        return f"state-{outcome}"
 
-@app.post("/record", dependencies=[Depends(verify_nexus_key)])
-async def record_node(request: Request, session: Session = Depends(get_session)):
+    try:
+        return await nexus_engine.config_digest(real_hostname)
+    except NexusError as e:
+        logger.error(f"Nexus version error for {real_hostname}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/record",
+    dependencies=[Depends(verify_nexus_key), Depends(load_shedder.guard(_telemetry_saturated))],
+)
+async def record_node(request: Request):
+    """
+    Acepta el informe al instante; el escritor de telemetría lo vuelca a la
+    base de datos en el siguiente lote.
+    """
     try:
         data = await request.json()
         m_id = data.get("machine_id")
@@ -148,67 +415,269 @@ async def record_node(request: Request, session: Session = Depends(get_session))
         if not m_id or not f_print:
             raise HTTPException(status_code=422, detail="Missing hardware identity")
 
-        full_log = data.pop("log", "")  # Optimización: evitar duplicidad en report_data
         client_ip = request.client.host if request.client else "0.0.0.0"
+        # En un latido (sin "log") se conserva el último informe completo
+        await telemetry.submit(build_report(data, client_ip))
+        return {"status": "ok"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Record error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to record")
 
-        statement = select(Machine).where(Machine.machine_id == m_id)
-        db_machine = session.exec(statement).first()
 
-        if not db_machine:
-            db_machine = Machine(
-                nodo=f"supplicant_{m_id[:8]}",
-                machine_id=m_id,
-                fingerprint=f_print,
-                status=NodeStatus.pending,
-            )
+def _cache_stats() -> Dict[str, Dict[str, int]]:
+    """Contadores de todas las cachés, con un nombre por caché."""
+    stats = {
+        "script": {
+            "hits": nexus_engine.script_cache_hits,
+            "misses": nexus_engine.script_cache_misses,
+        },
+        "compression": compressed_variants.stats(),
+        "static": nexus_engine.static.bodies.stats(),
+    }
+    for kind, index_stats in nexus_engine.file_index_stats().items():
+        stats[f"file_index_{kind}"] = index_stats
+    fragments = nexus_engine.fragment_cache_stats()
+    if fragments:
+        stats["fragments"] = fragments["cache"]
+    return stats
+
+
+# Métricas leídas al hacer scrape: no cuestan nada en el camino caliente
+metrics.counter(
+    "nexus_cache_hits_total",
+    "Aciertos por caché.",
+    ("cache",),
+    collect=lambda: {(k,): v["hits"] for k, v in _cache_stats().items()},
+)
+metrics.counter(
+    "nexus_cache_misses_total",
+    "Fallos por caché.",
+    ("cache",),
+    collect=lambda: {(k,): v["misses"] for k, v in _cache_stats().items()},
+)
+metrics.gauge(
+    "nexus_cache_bytes",
+    "Ocupación en bytes de las cachés acotadas.",
+    ("cache",),
+    collect=lambda: {(k,): v["bytes"] for k, v in _cache_stats().items() if "bytes" in v},
+)
+metrics.gauge(
+    "nexus_inventory_generation",
+    "Generación del inventario vigente.",
+    collect=lambda: {(): nexus_engine.generation},
+)
+metrics.gauge(
+    "nexus_inventory_hosts",
+    "Hosts en el inventario vigente.",
+    collect=lambda: {(): nexus_engine.host_count},
+)
+metrics.gauge(
+    "nexus_telemetry_queue_depth",
+    "Informes de /record pendientes de escribir.",
+    collect=lambda: {(): telemetry.stats()["queue_depth"]},
+)
+metrics.gauge(
+    "nexus_inflight_requests",
+    "Peticiones de agentes en curso (/get-task y /record).",
+    collect=lambda: {(): load_shedder.inflight},
+)
+metrics.gauge(
+    "nexus_inventory_owner",
+    "1 si este worker carga y publica el inventario compartido.",
+    collect=lambda: {(): int(nexus_engine.shared is None or nexus_engine.shared.is_owner)},
+)
+metrics.counter(
+    "nexus_telemetry_reports_total",
+    "Informes de /record por estado.",
+    ("state",),
+    collect=lambda: {
+        (state,): telemetry.stats()[state] for state in ("submitted", "written", "failed")
+    },
+)
 
-        db_machine.ip = data.get("ip")
-        db_machine.mac = data.get("mac")
-        db_machine.report_data = json.dumps(data)
-        db_machine.last_log = full_log
-        db_machine.via = client_ip
-        db_machine.fecha = datetime.now()
 
-        session.add(db_machine)
-        session.commit()
-        return {"status": "ok", "node_status": db_machine.status}
-    except Exception as e:
-        logger.exception(f"Record error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to record")
+@app.get("/metrics", dependencies=[Depends(verify_dashboard_access)])
+async def get_metrics():
+    """Métricas en formato Prometheus (misma lista blanca de IPs que /status)."""
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.post(
+    "/profiling",
+    dependencies=[Depends(verify_nexus_key), Depends(verify_dashboard_access)],
+)
+async def enable_profiling(
+    route: Optional[str] = None,
+    hostname: Optional[str] = None,
+    mode: str = "sampling",
+    rate: float = 1.0,
+    duration: float = 600.0,
+):
+    """
+    Activa el perfilado de las peticiones que coincidan con `route` (plantilla,
+    p. ej. /get-task/{hostname}) y/o `hostname`, durante `duration` segundos.
+    """
+    try:
+        request_profiler.add_rule(route, hostname, mode, rate, duration)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return request_profiler.status()
+
+
+@app.delete(
+    "/profiling",
+    dependencies=[Depends(verify_nexus_key), Depends(verify_dashboard_access)],
+)
+async def disable_profiling():
+    request_profiler.clear()
+    return request_profiler.status()
+
+
+@app.get(
+    "/profiling",
+    dependencies=[Depends(verify_nexus_key), Depends(verify_dashboard_access)],
+)
+async def profiling_status():
+    """Reglas activas y perfiles guardados."""
+    return request_profiler.status()
+
+
+@app.get(
+    "/profiling/summary",
+    dependencies=[Depends(verify_nexus_key), Depends(verify_dashboard_access)],
+)
+async def profiling_summary(name: Optional[str] = None, top: int = 25):
+    """Funciones más costosas de un perfil (por defecto, el más reciente)."""
+    try:
+        return await asyncio.to_thread(request_profiler.summary, name, top)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/telemetry/stats", dependencies=[Depends(verify_dashboard_access)])
+async def telemetry_stats():
+    """Profundidad de la cola y latencia de volcado del escritor de /record."""
+    return telemetry.stats()
+
+
+@app.get("/telemetry/history/{machine_id}", dependencies=[Depends(verify_dashboard_access)])
+async def telemetry_history(
+    machine_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 5000,
+):
+    """Histórico de un nodo en un rango (por defecto, las últimas 24 horas)."""
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    points = await run_db(history.query, machine_id, start, end, min(limit, 50000))
+    return {"machine_id": machine_id, "start": start, "end": end, "points": points}
 
 
 @app.post("/inventory/refresh", dependencies=[Depends(verify_nexus_key)])
 async def refresh_inventory():
     try:
         await nexus_engine.refresh_cache(force=True)
-        return {"status": "inventory refreshed"}
+        return {
+            "status": "inventory refreshed",
+            "generation": nexus_engine.generation,
+            "duplicate_nexus_ids": nexus_engine.duplicate_nexus_ids,
+        }
     except Exception as e:
         logger.error(f"Manual refresh failed: {e}")
         raise HTTPException(status_code=500, detail="Refresh failed")
 
 
+# Un solo pre-render a la vez: cada uno ocupa todas las CPUs
+_prerender_lock = asyncio.Lock()
+
+
+@app.post("/inventory/prerender", dependencies=[Depends(verify_nexus_key)])
+async def prerender_inventory(workers: int = 0, stale_only: bool = False):
+    """
+    Renderiza el script de todos los hosts en un pool de procesos y deja los
+    resultados en caché. Informa de tiempos, fallos y fragmentos más lentos.
+    Con stale_only=true solo los hosts sin script vigente en caché.
+
+    Las cachés son de cada proceso: con varios workers de uvicorn solo se
+    calienta el que atiende el POST (worker_pid en el informe); el resto
+    renderiza en su primer sondeo como hasta ahora.
+    """
+    if _prerender_lock.locked():
+        raise HTTPException(status_code=409, detail="Prerender already running")
+    async with _prerender_lock:
+        snapshot = await nexus_engine.get_snapshot()
+        return await asyncio.to_thread(
+            prerender_and_warm, snapshot, max(workers, 0), stale_only
+        )
+
+
+@app.get(
+    "/inventory/changes",
+    dependencies=[Depends(verify_nexus_key), Depends(verify_dashboard_access)],
+)
+async def inventory_changes(since: Optional[int] = None):
+    """
+    Hosts añadidos, quitados o con hostvars cambiadas desde la generación
+    `since` (por defecto, la anterior a la vigente), con las claves tocadas.
+    """
+    generation = nexus_engine.generation
+    return nexus_engine.changes_since(generation - 1 if since is None else since)
+
+
+@app.post("/bundle/{hostname}", dependencies=[Depends(verify_nexus_key)])
+async def get_bundle(hostname: str, kind: str, request: Request):
+    """
+    Modo bundle: el nodo envía sus hashes locales ("<md5|-> <ruta>" por línea)
+    y recibe un único tar con los archivos de su manifiesto que difieren.
+    """
+    if kind not in BUNDLE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown bundle kind: {kind}")
+    body = (await request.body()).decode("utf-8", errors="replace")
+    try:
+        manifest = await nexus_engine.get_manifest(hostname, kind)
+        members = select_members(kind, manifest, parse_client_hashes(body))
+    except InventoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except NexusError as e:
+        logger.error(f"Bundle error for {hostname}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    logger.info(f"Bundle {kind} for {hostname}: {len(members)} files")
+    return StreamingResponse(
+        stream_tar(members),
+        media_type="application/x-tar",
+        headers={"X-Nexus-Bundle-Files": str(len(members))},
+    )
+
+
 @app.get("/scripts/{filename}", dependencies=[Depends(verify_nexus_key)])
-async def get_static_script(filename: str):
-    script_base = Path("files/scripts").resolve()
-    target_path = (script_base / filename).resolve()
-    if not target_path.is_relative_to(script_base) or not target_path.exists():
-        raise HTTPException(status_code=404)
-    return FileResponse(target_path)
+async def get_static_script(
+    filename: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    return await served_file("scripts", filename, accept_encoding, if_none_match)
 
 
 @app.get("/skels/{filename}", dependencies=[Depends(verify_nexus_key)])
-async def get_skel_file(filename: str):
-    skel_base = Path("files/skels").resolve()
-    target_path = (skel_base / filename).resolve()
-    if not target_path.is_relative_to(skel_base) or not target_path.exists():
-        raise HTTPException(status_code=404)
-    return FileResponse(target_path)
+async def get_skel_file(
+    filename: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    return await served_file("skels", filename, accept_encoding, if_none_match)
 
 
 @app.get("/certs/{domain}/{filename}", dependencies=[Depends(verify_nexus_key)])
-async def get_certificate_file(domain: str, filename: str):
-    cert_base = Path("files/certs").resolve()
-    target_path = (cert_base / domain / filename).resolve()
-    if not target_path.is_relative_to(cert_base) or not target_path.exists():
-        raise HTTPException(status_code=404)
-    return FileResponse(target_path)
+async def get_certificate_file(
+    domain: str,
+    filename: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    return await served_file("certs", f"{domain}/{filename}", accept_encoding, if_none_match)
@@ -0,0 +1,253 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Métricas en formato de exposición de Prometheus (texto 0.0.4), sin
+# dependencias: cada observación es un bisect y una suma bajo un lock.
+
+LabelValues = Tuple[str, ...]
+# Callback de scrape: {valores de etiquetas: valor}
+Collect = Callable[[], Mapping[LabelValues, float]]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, str]) -> LabelValues:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono. Con `collect`, el valor se lee al hacer scrape."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), collect: Optional[Collect] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+        if not self.labelnames and collect is None:
+            self._values[()] = 0.0  # Visible desde el primer scrape
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        values = self._collect() if self._collect else dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Valor instantáneo (normalmente leído por callback al hacer scrape)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [cuentas por bucket..., +Inf], suma
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            snapshot = {k: (list(c), self._sums[k]) for k, c in self._counts.items()}
+        lines = []
+        for key, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # Un callback roto no debe tumbar el scrape entero
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), collect: Optional[Collect] = None) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames, collect))
+
+
+def gauge(name, documentation, labelnames=(), collect: Optional[Collect] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, collect))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Métricas del camino caliente (instrumentación directa) ---
+
+inventory_fetch_seconds = histogram(
+    "nexus_inventory_fetch_seconds", "Duración de la carga del inventario (_fetch_inventory)."
+)
+template_render_seconds = histogram(
+    "nexus_template_render_seconds",
+    "Renderizado de cada fragmento de plantilla (incluye aciertos del memo).",
+    ("template",),
+    FAST_BUCKETS,
+)
+hash_seconds = histogram(
+    "nexus_hash_seconds",
+    "Tiempo de hashing: archivos servidos y claves de caché de scripts.",
+    ("kind",),
+    FAST_BUCKETS,
+)
+telemetry_flush_seconds = histogram(
+    "nexus_telemetry_flush_seconds", "Volcado de un lote de /record a la base de datos."
+)
+db_commit_seconds = histogram(
+    "nexus_db_commit_seconds", "Latencia de las transacciones de escritura en SQLite.", ("op",)
+)
+http_request_seconds = histogram(
+    "nexus_http_request_seconds",
+    "Latencia por ruta (plantilla de la ruta, no la URL).",
+    ("method", "route", "status"),
+)
+not_modified_total = counter(
+    "nexus_not_modified_total", "Respuestas 304 de /get-task (el agente ya tenía el script)."
+)
+version_checks_total = counter(
+    "nexus_version_checks_total",
+    "Consultas de /get-version por resultado (digest o estado centinela).",
+    ("state",),
+)
+shed_total = counter(
+    "nexus_shed_total", "Peticiones rechazadas con 503 + Retry-After por carga.", ("route",)
+)
+inventory_changes_total = counter(
+    "nexus_inventory_changes_total",
+    "Hosts añadidos, quitados o cambiados en cada recarga de inventario.",
+    ("change",),
+)
+purges_total = counter("nexus_purges_total", "Scripts de purga entregados.")
+fingerprint_rejects_total = counter(
+    "nexus_fingerprint_rejects_total", "Peticiones rechazadas por huella de hardware distinta."
+)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: mide cada petición HTTP hasta el último byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # El router deja la ruta resuelta en el scope; sin ella, etiqueta
+            # fija para no disparar la cardinalidad con URLs arbitrarias
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
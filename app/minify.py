@@ -0,0 +1,245 @@
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import FileSystemLoader
+
+# Etiquetas de Jinja: opacas para el minificado (los comentarios se eliminan,
+# igualmente no producen salida)
+JINJA_TAGS = {"{{": "}}", "{%": "%}", "{#": "#}"}
+# `#` solo abre un comentario al principio de una palabra
+WORD_BREAK = " \t;&|()<>"
+# <<EOF, <<-EOF, << 'EOF', <<"EOF", <<\EOF
+HEREDOC = re.compile(r"<<(-?)[ \t]*(?:(['\"])([^'\"\n]+)\2|\\?(\w+))")
+
+
+# Contextos en los que el texto se copia tal cual (no es código a recortar)
+LITERAL = ("'", '"', "`", "$'", "${", "$((", "((")
+
+
+class _Scanner:
+    """
+    Minificado de shell en una pasada, línea a línea:
+
+    - elimina indentación, líneas vacías y comentarios (también al final de
+      línea), salvo el shebang de la primera línea;
+    - sigue comillas simples, dobles, $'...', backticks, ${...}, $(...) y
+      aritmética con una pila de contextos: un `#` o un `<<` dentro no es
+      comentario ni heredoc, y las cadenas multilínea se copian tal cual;
+    - copia literalmente el cuerpo de los heredocs (pueden ser scripts,
+      unidades de systemd o claves: la indentación y los `#` importan);
+    - trata {{ }}, {% %} y {# #} como opacos (lo que hay dentro de una
+      expresión de Jinja no es shell).
+    """
+
+    def __init__(self):
+        self.stack: List[str] = []
+        self.jinja: Optional[str] = None  # Cierre pendiente de una etiqueta
+        self.jinja_comment = False
+        self.continued = False  # La línea anterior terminó en `\`
+        self.pending: List[Tuple[str, bool]] = []  # Heredocs abiertos en esta línea
+        self.heredoc: Optional[Tuple[str, bool]] = None  # (delimitador, <<-)
+
+    @property
+    def _literal(self) -> bool:
+        return bool(self.stack) and self.stack[-1] in LITERAL
+
+    def minify(self, source: str) -> str:
+        out: List[str] = []
+        for number, line in enumerate(source.split("\n")):
+            if self.heredoc is not None:
+                out.append(line)
+                delimiter, strip_tabs = self.heredoc
+                if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                    self.heredoc = self.pending.pop(0) if self.pending else None
+                continue
+            if number == 0 and line.startswith("#!"):
+                out.append(line)
+                continue
+            kept = self._line(line)
+            if kept is not None:
+                out.append(kept)
+            if self.pending and self.heredoc is None and not self._literal:
+                self.heredoc = self.pending.pop(0)
+        return "\n".join(out)
+
+    def _line(self, line: str) -> Optional[str]:
+        """Código de la línea sin comentario, o None si no queda nada."""
+        in_string = self._literal or (self.jinja is not None and not self.jinja_comment)
+        was_continued = self.continued
+        if not in_string and self.jinja is None:
+            stripped = line.lstrip(" \t")
+            # Tras `\` la indentación separa palabras: basta con un espacio
+            if was_continued and len(stripped) < len(line):
+                stripped = " " + stripped
+            line = stripped
+
+        code: List[str] = []
+        i, n = 0, len(line)
+        while i < n:
+            if self.jinja is not None:
+                end = line.find(self.jinja, i)
+                stop = n if end < 0 else end + 2
+                if not self.jinja_comment:
+                    code.append(line[i:stop])
+                if end >= 0:
+                    self.jinja = None
+                    self.jinja_comment = False
+                i = stop
+                continue
+            pair = line[i : i + 2]
+            if pair in JINJA_TAGS:
+                self.jinja = JINJA_TAGS[pair]
+                self.jinja_comment = pair == "{#"
+                if not self.jinja_comment:
+                    code.append(pair)
+                i += 2
+                continue
+            if self._step(line, i, code):
+                self._comment(line, i, code)
+                break
+            i += len(code[-1])
+
+        text = "".join(code)
+        if self._literal or (self.jinja is not None and not self.jinja_comment):
+            # La cadena (o la etiqueta) sigue en la línea siguiente: nada que recortar
+            self.continued = False
+            return text
+        trimmed = text.rstrip(" \t")
+        # `\ ` al final es un espacio escapado: se conserva
+        if len(trimmed) < len(text) and _odd_backslashes(trimmed):
+            trimmed += text[len(trimmed)]
+        self.continued = _odd_backslashes(trimmed)
+        if trimmed or in_string:
+            return trimmed
+        # Vacía tras una continuación: hay que conservarla, cierra el comando
+        return "" if was_continued else None
+
+    def _comment(self, line: str, i: int, code: List[str]):
+        """
+        Descarta un comentario de shell, pero no los {% %} que contenga:
+        Jinja los ejecuta igual y quitarlos rompería la estructura.
+        """
+        while True:
+            start = min(
+                (pos for pos in (line.find(tag, i) for tag in JINJA_TAGS) if pos >= 0),
+                default=-1,
+            )
+            if start < 0:
+                return
+            pair = line[start : start + 2]
+            end = line.find(JINJA_TAGS[pair], start + 2)
+            if end < 0:
+                # Etiqueta que sigue en otra línea
+                self.jinja = JINJA_TAGS[pair]
+                self.jinja_comment = pair != "{%"
+                if pair == "{%":
+                    code.append(line[start:])
+                return
+            if pair == "{%":
+                code.append(line[start : end + 2])
+            i = end + 2
+
+    def _step(self, line: str, i: int, code: List[str]) -> bool:
+        """Consume un token en `i` y lo añade a `code`. True = empieza un comentario."""
+        top = self.stack[-1] if self.stack else None
+        c = line[i]
+
+        if top == "'":
+            if c == "'":
+                self.stack.pop()
+            code.append(c)
+            return False
+        if c == "\\" and top != "'":
+            code.append(line[i : i + 2])
+            return False
+        if top in ('"', "`", "$'"):
+            if c == top[-1]:
+                self.stack.pop()
+                code.append(c)
+            elif top == '"' and line.startswith(("$(", "${"), i) and not line.startswith("$((", i):
+                self.stack.append(line[i : i + 2])
+                code.append(line[i : i + 2])
+            else:
+                code.append(c)
+            return False
+        if top in ("$((", "(("):
+            if line.startswith("))", i):
+                self.stack.pop()
+                code.append("))")
+            elif c == "(":
+                self.stack.append("(")
+                code.append(c)
+            else:
+                code.append(c)
+            return False
+        if top == "${" and c == "}":
+            self.stack.pop()
+            code.append(c)
+            return False
+
+        # Código (nivel superior, $(...), (...)) o el interior de ${...}
+        if top != "${" and c == "#" and (i == 0 or line[i - 1] in WORD_BREAK):
+            return True
+        if c == ")" and top in ("$(", "("):
+            self.stack.pop()
+            code.append(c)
+        elif c in "'\"`":
+            self.stack.append(c)
+            code.append(c)
+        elif line.startswith(("$'", "${"), i):
+            self.stack.append(line[i : i + 2])
+            code.append(line[i : i + 2])
+        elif line.startswith("$((", i):
+            self.stack.append("$((")
+            code.append("$((")
+        elif line.startswith("((", i) and (i == 0 or line[i - 1] in WORD_BREAK):
+            self.stack.append("((")
+            code.append("((")
+        elif line.startswith("$(", i):
+            self.stack.append("$(")
+            code.append("$(")
+        elif c == "(" and top != "${":
+            self.stack.append("(")
+            code.append(c)
+        elif line.startswith("<<<", i):
+            code.append("<<<")
+        elif top != "${" and (match := HEREDOC.match(line, i)):
+            delimiter = match.group(3) or match.group(4)
+            self.pending.append((delimiter, match.group(1) == "-"))
+            code.append(match.group(0))
+        else:
+            code.append(c)
+        return False
+
+
+def _odd_backslashes(text: str) -> bool:
+    return (len(text) - len(text.rstrip("\\"))) % 2 == 1
+
+
+def minify_shell(source: str) -> str:
+    """Minifica un script de shell (o plantilla Jinja de shell)."""
+    return _Scanner().minify(source)
+
+
+class MinifyingLoader(FileSystemLoader):
+    """
+    FileSystemLoader que minifica el fuente de las plantillas .sh.j2 al
+    cargarlas: el resultado compilado (y su bytecode) ya sale minificado y el
+    renderizado no necesita post-proceso por petición.
+
+    Guarda además el checksum del fuente de cada carga: es lo que el entorno
+    compiló de verdad (con auto_reload=False, editar el archivo no cambia
+    nada hasta reiniciar o hasta que la plantilla salga de la caché).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checksums: Dict[str, str] = {}
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        if filename.endswith(".sh.j2"):
+            source = minify_shell(source)
+        self.checksums[template] = hashlib.sha256(source.encode()).hexdigest()
+        return source, filename, uptodate
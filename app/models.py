@@ -1,8 +1,20 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional, TypeVar
+from sqlalchemy import Index, event, inspect, text
 from sqlmodel import Field, SQLModel, create_engine
 from enum import Enum
 
+from .config import get_settings
+
+T = TypeVar("T")
+
+
+# Un nodo está Online si reportó en esta ventana (intervalo del timer + margen)
+ONLINE_WINDOW = timedelta(minutes=40)
+
 
 class NodeStatus(str, Enum):
     pending = "pending"
@@ -11,6 +23,9 @@ class NodeStatus(str, Enum):
 
 
 class Machine(SQLModel, table=True):
+    # Listado del dashboard: paginación por clave sobre (fecha, id)
+    __table_args__ = (Index("ix_machine_fecha_id", "fecha", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nodo: str = Field(index=True, unique=True)
     machine_id: str = Field(index=True, unique=True)
@@ -20,20 +35,116 @@ class Machine(SQLModel, table=True):
     mac: Optional[str] = None
     vpn: Optional[str] = None
     via: Optional[str] = None
-    report_data: Optional[str] = None
-    last_log: Optional[str] = None
     fecha: datetime = Field(default_factory=datetime.now)
 
     @property
     def is_online(self) -> bool:
-        return datetime.now() - self.fecha < timedelta(minutes=40)
+        return datetime.now() - self.fecha < ONLINE_WINDOW
+
+
+class MachineReport(SQLModel, table=True):
+    """
+    Último informe completo de cada nodo (log y JSON). Fuera de Machine: la
+    admisión y el listado leen filas pequeñas y un latido no reescribe blobs.
+    """
+
+    __tablename__ = "machine_report"
+
+    machine_id: str = Field(primary_key=True)
+    report_data: Optional[str] = None
+    last_log: Optional[str] = None
+    fecha: datetime = Field(default_factory=datetime.now)
+
+
+class TelemetryPoint(SQLModel, table=True):
+    """
+    Histórico de telemetría (solo inserciones). Un punto crudo por /record;
+    la retención los agrega en puntos horarios y luego diarios.
+    """
+
+    __tablename__ = "telemetry_point"
+    __table_args__ = (
+        Index("ix_telemetry_machine_ts", "machine_id", "timestamp"),
+        # Retención: puntos de una resolución anteriores a un corte
+        Index("ix_telemetry_resolution_ts", "resolution", "timestamp"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    machine_id: str
+    timestamp: datetime
+    # Segundos que cubre el punto: 0 = crudo, 3600 = hora, 86400 = día
+    resolution: int = 0
+    reports: int = 0  # Informes completos (con log)
+    heartbeats: int = 0  # Latidos (script sin cambios)
+    log_bytes: int = 0  # Tamaño del log (el máximo del periodo si está agregado)
+    ip: Optional[str] = None
+    mac: Optional[str] = None
+    vpn: Optional[str] = None
+    via: Optional[str] = None
 
 
 # Configuración del motor de SQLite
 sqlite_file_name = "data/registrator.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
-engine = create_engine(sqlite_url, echo=False)
+_db_threads = get_settings().nexus_db_threads
+engine = create_engine(
+    sqlite_url,
+    echo=False,
+    # Una conexión por hilo del pool de DB; las conexiones cambian de hilo
+    connect_args={"check_same_thread": False},
+    pool_size=_db_threads,
+    max_overflow=2,
+)
+
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, _record):
+    settings = get_settings()
+    cursor = dbapi_connection.cursor()
+    # WAL: los lectores (dashboard) no bloquean al escritor de telemetría
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Con WAL, NORMAL solo sincroniza en checkpoint: sin fsync por commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.nexus_db_busy_timeout_ms}")
+    cursor.execute(f"PRAGMA mmap_size={settings.nexus_db_mmap_bytes}")
+    cursor.close()
+
+
+# Pool acotado para el trabajo síncrono de SQLite: los handlers async nunca
+# bloquean el event loop esperando a la base de datos
+_db_pool = ThreadPoolExecutor(max_workers=_db_threads, thread_name_prefix="nexus-db")
+
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """Ejecuta `fn(*args)` (acceso síncrono a la DB) en el pool de DB."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_pool, functools.partial(fn, *args))
 
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all no añade índices nuevos a tablas que ya existían
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    _migrate_machine_blobs()
+
+
+def _migrate_machine_blobs():
+    """
+    Bases de datos anteriores: el último log e informe vivían en machine.
+    Se copian a machine_report y las columnas se eliminan (SQLite >= 3.35).
+    """
+    columns = {c["name"] for c in inspect(engine).get_columns("machine")}
+    if not {"report_data", "last_log"} <= columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO machine_report (machine_id, report_data, last_log, fecha) "
+                "SELECT machine_id, report_data, last_log, fecha FROM machine "
+                "WHERE report_data IS NOT NULL OR last_log IS NOT NULL"
+            )
+        )
+        conn.execute(text("ALTER TABLE machine DROP COLUMN report_data"))
+        conn.execute(text("ALTER TABLE machine DROP COLUMN last_log"))
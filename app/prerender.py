@@ -0,0 +1,250 @@
+"""
+Pre-renderizado de toda la flota en un pool de procesos.
+
+Desde el servidor (POST /inventory/prerender) deja cada script y sus
+variantes comprimidas en las cachés del worker que atiende la petición, para
+que el primer sondeo tras un cambio de inventario no pague el renderizado. Desde la línea de
+comandos sirve como validación rápida de un inventario pendiente:
+
+    uv run python -m app.prerender [--workers N] [--host H ...] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .compression import SUPPORTED, compress, compressed_variants
+from .config import get_settings
+from .engine import nexus_engine
+from .snapshot import InventorySnapshot
+
+logger = logging.getLogger("nexus.prerender")
+
+# Snapshot y opciones de cada proceso del pool (initializer, una vez por proceso)
+_worker_snapshot: Optional[InventorySnapshot] = None
+_worker_keep_output = False
+
+
+def _init_worker(generation: int, data: Dict[str, Any], keep_output: bool):
+    global _worker_snapshot, _worker_keep_output
+    logging.basicConfig(level=logging.WARNING)
+    _worker_snapshot = InventorySnapshot.build(generation, data)
+    _worker_keep_output = keep_output
+    nexus_engine.warm_up()
+
+
+def _render_host(hostname: str) -> Dict[str, Any]:
+    """Tarea del pool: renderiza un host y mide cada fragmento."""
+    timings: List[Tuple[str, float]] = []
+    result: Dict[str, Any] = {"hostname": hostname, "error": None}
+    start = time.perf_counter()
+    try:
+        script = nexus_engine.render_for(_worker_snapshot, hostname, timings)
+    except Exception as e:
+        # UndefinedError llega envuelto en RenderingError: mostramos el origen
+        cause = e.__context__ if e.__context__ is not None else e
+        result["error"] = f"{type(cause).__name__}: {e}"
+        script = None
+    result["ms"] = (time.perf_counter() - start) * 1000
+    result["fragments"] = timings
+
+    if script is not None and _worker_keep_output:
+        # La compresión también se hace aquí, fuera del proceso del servidor
+        body = script.encode()
+        result["script"] = script
+        result["compressed"] = (
+            {enc: compress(body, enc) for enc in SUPPORTED}
+            if len(body) >= compressed_variants.min_size
+            else {}
+        )
+    return result
+
+
+def snapshot_data(snapshot: InventorySnapshot) -> Dict[str, Any]:
+    """Snapshot en el formato de `ansible-inventory --list` (para pasarlo al pool)."""
+    return snapshot.to_data()
+
+
+def render_fleet(
+    snapshot: InventorySnapshot,
+    hostnames: Optional[Sequence[str]] = None,
+    workers: int = 0,
+    keep_output: bool = False,
+) -> List[Dict[str, Any]]:
+    """Renderiza `hostnames` (por defecto, todo el inventario) en paralelo."""
+    hosts = sorted(hostnames if hostnames is not None else snapshot.hostvars)
+    if not hosts:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(hosts))
+    # spawn: los procesos no heredan el event loop ni los hilos del servidor
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(snapshot.generation, snapshot_data(snapshot), keep_output),
+    ) as pool:
+        chunksize = max(1, len(hosts) // (workers * 4))
+        return list(pool.map(_render_host, hosts, chunksize=chunksize))
+
+
+def build_report(
+    generation: int,
+    results: Sequence[Dict[str, Any]],
+    elapsed: float,
+    workers: int,
+    top: int = 10,
+) -> Dict[str, Any]:
+    """Informe: tiempo por host, fallos y fragmentos más lentos."""
+    fragments: Dict[str, List[float]] = {}
+    for r in results:
+        for name, ms in r["fragments"]:
+            fragments.setdefault(name, []).append(ms)
+    slowest = sorted(
+        (
+            {
+                "template": name,
+                "calls": len(times),
+                "total_ms": round(sum(times), 2),
+                "max_ms": round(max(times), 2),
+            }
+            for name, times in fragments.items()
+        ),
+        key=lambda f: f["total_ms"],
+        reverse=True,
+    )
+    failures = {r["hostname"]: r["error"] for r in results if r["error"]}
+    return {
+        "generation": generation,
+        "hosts": len(results),
+        "ok": len(results) - len(failures),
+        "failed": len(failures),
+        "workers": workers,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "failures": failures,
+        "slowest_hosts": [
+            {"hostname": r["hostname"], "ms": round(r["ms"], 2)}
+            for r in sorted(results, key=lambda r: r["ms"], reverse=True)[:top]
+        ],
+        "slowest_fragments": slowest[:top],
+    }
+
+
+def prerender_and_warm(
+    snapshot: InventorySnapshot, workers: int = 0, stale_only: bool = False
+) -> Dict[str, Any]:
+    """
+    Pre-render desde el servidor: las claves de caché se calculan antes de
+    repartir el trabajo, así un cambio de plantilla a mitad de pasada deja
+    entradas con la clave antigua (fallo de caché, nunca un script obsoleto).
+    Con `stale_only` se omiten los hosts cuyo script en caché sigue valiendo:
+    tras una recarga, solo los que tocó el diff de inventario.
+
+    Solo calienta las cachés de este proceso: los demás workers de uvicorn no
+    las comparten. El informe lleva `worker_pid` para saber cuál fue.
+    """
+    start = time.perf_counter()
+    workers = workers or get_settings().nexus_prerender_workers or os.cpu_count() or 1
+    keys: Dict[str, str] = {}
+    early: List[Dict[str, Any]] = []
+    skipped = 0
+    for hostname in snapshot.hostvars:
+        try:
+            key = nexus_engine.script_cache_key(snapshot, hostname)
+            if stale_only and nexus_engine.is_cached(hostname, key):
+                skipped += 1
+                continue
+            keys[hostname] = key
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            early.append({"hostname": hostname, "error": error, "ms": 0.0, "fragments": []})
+
+    results = render_fleet(snapshot, list(keys), workers, keep_output=True) if keys else []
+
+    warmed = 0
+    for r in results:
+        script = r.pop("script", None)
+        compressed = r.pop("compressed", {})
+        if script is None:
+            continue
+        etag = nexus_engine.install_script(snapshot, r["hostname"], keys[r["hostname"]], script)
+        if etag is None:
+            continue
+        for encoding, body in compressed.items():
+            compressed_variants.put(etag.strip('"'), encoding, body)
+        warmed += 1
+
+    report = build_report(
+        snapshot.generation, early + results, time.perf_counter() - start, workers
+    )
+    report["warmed"] = warmed
+    report["skipped"] = skipped
+    report["worker_pid"] = os.getpid()
+    logger.info(
+        f"Prerender gen {snapshot.generation}: {report['ok']}/{report['hosts']} hosts "
+        f"in {report['elapsed_ms']:.0f}ms ({warmed} cached, {skipped} up to date, "
+        f"{report['failed']} failed)"
+    )
+    return report
+
+
+def _print_report(report: Dict[str, Any]):
+    print(
+        f"Generación {report['generation']}: {report['ok']}/{report['hosts']} hosts OK "
+        f"en {report['elapsed_ms']:.0f}ms ({report['workers']} procesos)"
+    )
+    if report["failures"]:
+        print(f"\n❌ Fallos ({report['failed']}):")
+        for hostname, error in sorted(report["failures"].items()):
+            print(f"  {hostname}: {error}")
+    print("\nHosts más lentos:")
+    for h in report["slowest_hosts"]:
+        print(f"  {h['ms']:9.2f}ms  {h['hostname']}")
+    print("\nFragmentos más lentos (total):")
+    for f in report["slowest_fragments"]:
+        print(
+            f"  {f['total_ms']:9.2f}ms  max {f['max_ms']:7.2f}ms  "
+            f"x{f['calls']:<5} {f['template']}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Renderiza el script de todos los hosts del inventario en paralelo."
+    )
+    parser.add_argument("--workers", type=int, default=0, help="procesos (0 = uno por CPU)")
+    parser.add_argument("--host", action="append", help="limitar a estos hosts")
+    parser.add_argument("--top", type=int, default=10, help="entradas en los rankings")
+    parser.add_argument("--json", action="store_true", help="informe en JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # Lee el inventario del disco: valida el cambio aún no recargado por el servidor
+    snapshot = asyncio.run(nexus_engine.get_snapshot())
+    nexus_engine.warm_up()
+    missing = sorted(set(args.host or ()) - set(snapshot.hostvars))
+    if missing:
+        print(f"Hosts no encontrados en el inventario: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    workers = args.workers or get_settings().nexus_prerender_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = render_fleet(snapshot, args.host, workers)
+    report = build_report(
+        snapshot.generation, results, time.perf_counter() - start, workers, args.top
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import asyncio
+import cProfile
+import collections
+import io
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.routing import Match
+
+from .config import get_settings
+
+logger = logging.getLogger("nexus.profiling")
+
+MODES = ("deterministic", "sampling")
+
+
+@dataclass
+class ProfileRule:
+    """Qué peticiones se perfilan: ruta (plantilla) y/o hostname, None = cualquiera."""
+
+    route: Optional[str]
+    hostname: Optional[str]
+    mode: str
+    rate: float
+    expires_at: float
+
+    def matches(self, route: str, hostname: Optional[str]) -> bool:
+        if self.route is not None and self.route != route:
+            return False
+        return self.hostname is None or self.hostname == hostname
+
+
+class StackSampler:
+    """
+    Perfilado por muestreo: un hilo lee las pilas de todos los hilos cada
+    `interval` segundos. Ve también el pool de DB (cProfile solo ve el hilo
+    del event loop), pero incluye lo que hagan peticiones concurrentes.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="nexus-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        path = Path(code.co_filename)
+        return f"{path.parent.name}/{path.name}:{code.co_qualname}"
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                # Formato "folded" (raíz;...;hoja), el que usan los flamegraphs
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """
+    Perfilado opt-in por ruta o hostname. Límites para producción: como mucho
+    un perfil a la vez, una fracción `rate` de las peticiones que coinciden y
+    un máximo de perfiles por minuto. Los archivos rotan (se guardan los N
+    más recientes).
+
+    El modo determinista (cProfile) instrumenta el hilo del event loop
+    mientras dura la petición: registra también cualquier otra corrutina que
+    corra entretanto (peticiones concurrentes, tareas de fondo), y no ve el
+    pool de DB ni otros hilos.
+    """
+
+    def __init__(self, directory: str, keep: int, max_per_minute: int, interval_ms: float):
+        self.directory = Path(directory)
+        self.keep = keep
+        self.max_per_minute = max_per_minute
+        self.interval = interval_ms / 1000
+        self.rules: List[ProfileRule] = []
+        self._busy = threading.Lock()
+        self._recent: collections.deque = collections.deque()
+        self.captured = 0
+        self.skipped = 0
+
+    # --- Reglas (endpoints de administración) ---
+
+    def add_rule(
+        self,
+        route: Optional[str],
+        hostname: Optional[str],
+        mode: str,
+        rate: float,
+        duration: float,
+    ) -> ProfileRule:
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        rule = ProfileRule(route, hostname, mode, min(max(rate, 0.0), 1.0), time.time() + duration)
+        self.rules.append(rule)
+        logger.warning(f"Profiling enabled: {rule}")
+        return rule
+
+    def clear(self):
+        self.rules = []
+        logger.warning("Profiling disabled")
+
+    def active_rules(self) -> List[ProfileRule]:
+        now = time.time()
+        self.rules = [r for r in self.rules if r.expires_at > now]
+        return self.rules
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "rules": [asdict(r) for r in self.active_rules()],
+            "captured": self.captured,
+            "skipped": self.skipped,
+            "profiles": self.list_profiles(),
+        }
+
+    # --- Decisión por petición ---
+
+    def _select(self, scope) -> Optional[Tuple[ProfileRule, str, Optional[str]]]:
+        rules = self.active_rules()
+        if not rules:
+            return None
+        # Resolvemos la ruta igual que el router (solo si hay reglas activas)
+        for route in scope["app"].router.routes:
+            match, child = route.matches(scope)
+            if match == Match.FULL:
+                template = getattr(route, "path", "")
+                hostname = child.get("path_params", {}).get("hostname")
+                for rule in rules:
+                    if rule.matches(template, hostname):
+                        return rule, template, hostname
+                return None
+        return None
+
+    def _admit(self, rule: ProfileRule) -> bool:
+        if random.random() >= rule.rate:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_per_minute:
+            self.skipped += 1
+            return False
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return False
+        self._recent.append(now)
+        return True
+
+    # --- Captura y almacenamiento ---
+
+    def _save(self, name: str, write) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        write(path)
+        # Rotación: nos quedamos con los `keep` más recientes
+        files = sorted(self.directory.glob("*.*"), key=lambda p: p.stat().st_mtime)
+        for old in files[: max(len(files) - self.keep, 0)]:
+            old.unlink(missing_ok=True)
+        self.captured += 1
+        return path
+
+    def _finish_sampling(self, sampler: StackSampler, name: str) -> Path:
+        sampler.stop()
+        return self._save(name, lambda p: p.write_text(sampler.folded()))
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [{"name": p.name, "bytes": p.stat().st_size} for p in files]
+
+    @staticmethod
+    def _slug(route: str, hostname: Optional[str]) -> str:
+        base = route.strip("/").split("/{")[0].replace("/", "_") or "root"
+        return f"{base}-{hostname}" if hostname else base
+
+    async def profile(self, app, scope, receive, send):
+        selected = self._select(scope) if scope["type"] == "http" else None
+        if selected is None or not self._admit(selected[0]):
+            await app(scope, receive, send)
+            return
+
+        rule, route, hostname = selected
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        name = f"{stamp}-{self._slug(route, hostname)}"
+        start = time.perf_counter()
+        try:
+            if rule.mode == "deterministic":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await app(scope, receive, send)
+                finally:
+                    profiler.disable()
+                    # Volcado y rotación fuera del event loop
+                    await asyncio.to_thread(
+                        self._save, f"{name}.prof", lambda p: profiler.dump_stats(str(p))
+                    )
+            else:
+                sampler = StackSampler(self.interval)
+                sampler.start()
+                try:
+                    await app(scope, receive, send)
+                finally:
+                    # El join del hilo muestreador, el volcado y la rotación, fuera del loop
+                    await asyncio.to_thread(self._finish_sampling, sampler, f"{name}.folded")
+        finally:
+            self._busy.release()
+            elapsed = (time.perf_counter() - start) * 1000
+            logger.info(f"Profiled {scope['method']} {scope['path']} ({rule.mode}) in {elapsed:.1f}ms")
+
+    # --- Resumen ---
+
+    def summary(self, name: Optional[str] = None, top: int = 25) -> Dict[str, Any]:
+        """Funciones más costosas de un perfil (por defecto, el más reciente)."""
+        profiles = self.list_profiles()
+        if name is None:
+            if not profiles:
+                raise FileNotFoundError("No profiles captured yet")
+            name = profiles[0]["name"]
+        path = (self.directory / name).resolve()
+        if not path.is_relative_to(self.directory.resolve()) or not path.is_file():
+            raise FileNotFoundError(f"Profile not found: {name}")
+        if path.suffix == ".prof":
+            return {"name": name, "mode": "deterministic", **self._summary_prof(path, top)}
+        return {"name": name, "mode": "sampling", **self._summary_folded(path, top)}
+
+    @staticmethod
+    def _summary_prof(path: Path, top: int) -> Dict[str, Any]:
+        stats = pstats.Stats(str(path), stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            # Las funciones built-in llegan como ("~", 0, "<built-in ...>")
+            where = f"{Path(filename).parent.name}/{Path(filename).name}:{line}"
+            rows.append(
+                {
+                    "function": func if filename == "~" else f"{where}({func})",
+                    "calls": nc,
+                    "tottime_ms": round(tt * 1000, 3),
+                    "cumtime_ms": round(ct * 1000, 3),
+                }
+            )
+        return {
+            "total_ms": round(stats.total_tt * 1000, 3),
+            "by_cumulative": sorted(rows, key=lambda r: r["cumtime_ms"], reverse=True)[:top],
+            "by_self": sorted(rows, key=lambda r: r["tottime_ms"], reverse=True)[:top],
+        }
+
+    @staticmethod
+    def _summary_folded(path: Path, top: int) -> Dict[str, Any]:
+        inclusive: collections.Counter = collections.Counter()
+        own: collections.Counter = collections.Counter()
+        total = 0
+        for line in path.read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            frames = stack.split(";")
+            n = int(count)
+            total += n
+            own[frames[-1]] += n
+            for frame in set(frames):  # Recursión: una vez por pila
+                inclusive[frame] += n
+        return {
+            "stack_samples": total,
+            "by_cumulative": [{"function": f, "samples": n} for f, n in inclusive.most_common(top)],
+            "by_self": [{"function": f, "samples": n} for f, n in own.most_common(top)],
+        }
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: sin reglas activas cuesta una comprobación por petición."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not request_profiler.rules:
+            await self.app(scope, receive, send)
+            return
+        await request_profiler.profile(self.app, scope, receive, send)
+
+
+request_profiler = RequestProfiler(
+    get_settings().nexus_profile_dir,
+    get_settings().nexus_profile_keep,
+    get_settings().nexus_profile_max_per_minute,
+    get_settings().nexus_profile_sample_interval_ms,
+)
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from .config import get_settings
+from .metrics import shed_total
+
+logger = logging.getLogger("nexus.scheduler")
+
+# Unidades de los intervalos estilo systemd ("30min", "1h 30min", "90s")
+_UNITS = {
+    "s": 1, "sec": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hour": 3600, "hours": 3600,
+    "d": 86400, "day": 86400, "days": 86400,
+}
+_SPAN = re.compile(r"(\d+)\s*([a-z]*)")
+
+HOUR = 3600
+DAY = 86400
+
+
+def parse_interval(value: Any) -> int:
+    """Segundos de un intervalo systemd ("30min", "1h 30min") o de un número."""
+    if isinstance(value, (int, float)):
+        seconds = int(value)
+    else:
+        text = str(value).strip().lower()
+        parts = _SPAN.findall(text)
+        if not parts or _SPAN.sub("", text).strip():
+            raise ValueError(f"Invalid interval: {value!r}")
+        seconds = 0
+        for amount, unit in parts:
+            if unit not in _UNITS and unit != "":
+                raise ValueError(f"Invalid interval unit: {unit!r}")
+            seconds += int(amount) * _UNITS.get(unit, 1)
+    if seconds <= 0:
+        raise ValueError(f"Interval must be positive: {value!r}")
+    return seconds
+
+
+@dataclass(frozen=True)
+class PollSlot:
+    """
+    Hueco de sondeo de un host: `offset` segundos dentro de cada `interval`.
+    Si el intervalo divide la hora o el día el hueco es fijo en el reloj
+    (OnCalendar / cron); si no, solo se desfasa el primer disparo tras el arranque.
+    """
+
+    interval: int
+    offset: int
+
+    def on_calendar(self) -> Optional[str]:
+        second = self.offset % 60
+        if self.interval % 60 == 0 and HOUR % self.interval == 0:
+            minute = self.offset // 60
+            return f"*-*-* *:{minute:02d}/{self.interval // 60}:{second:02d}"
+        if self.interval % HOUR == 0 and DAY % self.interval == 0:
+            hour, minute = self.offset // HOUR, (self.offset % HOUR) // 60
+            return f"*-*-* {hour:02d}/{self.interval // HOUR}:{minute:02d}:{second:02d}"
+        return None
+
+    def cron(self) -> Optional[str]:
+        """Línea de cron (sin segundos: el agente duerme `cron_sleep` antes)."""
+        if self.interval % 60 == 0 and HOUR % self.interval == 0:
+            return f"{self.offset // 60}-59/{self.interval // 60} * * * *"
+        if self.interval % HOUR == 0 and DAY % self.interval == 0:
+            hour, minute = self.offset // HOUR, (self.offset % HOUR) // 60
+            return f"{minute} {hour}-23/{self.interval // HOUR} * * *"
+        return None
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Tras el arranque, 1-6 min según el hueco: los nodos que arrancan a la vez no coinciden
+        return {
+            "interval": self.interval,
+            "offset": self.offset,
+            "on_calendar": self.on_calendar(),
+            "on_boot_sec": 60 + self.offset % 300,
+            "cron": self.cron(),
+            "cron_sleep": self.offset % 60,
+        }
+
+
+def poll_slot(hostname: str, interval: Any) -> PollSlot:
+    """
+    Hueco estable del host: hash del hostname módulo el intervalo. Con un hash
+    uniforme la flota queda repartida por todo el intervalo, y añadir o quitar
+    nodos no mueve el hueco de los demás.
+    """
+    try:
+        seconds = parse_interval(interval)
+    except ValueError as e:
+        logger.warning(f"{hostname}: {e}, using 30min")
+        seconds = 1800
+    digest = hashlib.sha256(hostname.encode()).digest()
+    return PollSlot(seconds, int.from_bytes(digest[:8], "big") % seconds)
+
+
+class LoadShedder:
+    """
+    Control de admisión para las rutas que llaman los agentes. Por encima de
+    `max_inflight` peticiones en curso (o si `pressure` indica saturación)
+    responde 503 con un Retry-After con jitter, para que los reintentos no
+    lleguen otra vez todos juntos.
+    """
+
+    def __init__(self, max_inflight: int, retry_after: int):
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.inflight = 0
+
+    def retry_after_hint(self) -> int:
+        return self.retry_after + random.randint(0, self.retry_after)
+
+    def guard(self, pressure: Optional[Callable[[], bool]] = None):
+        """Dependencia de FastAPI que cuenta la petición mientras dura."""
+
+        async def dependency(request: Request):
+            overloaded = 0 < self.max_inflight <= self.inflight
+            if overloaded or (pressure is not None and pressure()):
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                shed_total.inc(route=route)
+                raise HTTPException(
+                    status_code=503,
+                    detail="Manager busy, retry later.",
+                    headers={"Retry-After": str(self.retry_after_hint())},
+                )
+            self.inflight += 1
+            try:
+                yield
+            finally:
+                self.inflight -= 1
+
+        return dependency
+
+
+load_shedder = LoadShedder(
+    get_settings().nexus_max_inflight,
+    get_settings().nexus_retry_after_seconds,
+)
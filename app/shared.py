@@ -0,0 +1,199 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .exceptions import InventoryError
+from .inventory import read_vault_password
+from .snapshot import InventorySnapshot
+
+logger = logging.getLogger("nexus.shared")
+
+# Cabecera: magic, generación, nonce de AES-GCM. Magic y generación van como
+# datos autenticados: no se pueden alterar sin invalidar el archivo.
+MAGIC = b"NXSNAP01"
+HEADER = struct.Struct(">8sQ12s")
+
+
+class SharedSnapshotStore:
+    """
+    Snapshot de inventario compartido entre workers de uvicorn.
+
+    Un único proceso (el que obtiene el flock) carga el inventario y publica
+    cada generación en disco: JSON comprimido con zlib y cifrado con AES-GCM
+    bajo una clave derivada de la contraseña del Vault (las hostvars llevan
+    secretos ya descifrados). El resto de workers mapean el archivo y adoptan
+    la generación nueva sin re-parsear ni descifrar el inventario. Al
+    arrancar, el último snapshot en disco se sirve mientras llega uno fresco.
+    """
+
+    def __init__(self, path: str, vault_password_file: str = ".vault_pass"):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.reload_path = self.path.with_name(self.path.name + ".reload")
+        self.vault_password_file = Path(vault_password_file)
+        self._key: Optional[bytes] = None
+        self._key_sig: Optional[Tuple[int, int]] = None
+        self._lock_fd: Optional[int] = None
+        # Firma del último archivo leído: solo se vuelve a mapear si cambia
+        self._seen: Optional[Tuple[int, int, int]] = None
+        self.published = 0
+        self.adopted = 0
+
+    # --- Clave ---
+
+    def _derive_key(self) -> bytes:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        st = self.vault_password_file.stat()
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig != self._key_sig:
+            password = read_vault_password(self.vault_password_file)
+            hkdf = HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=b"nexus-shared-snapshot",
+                info=b"inventory-snapshot-v1",
+            )
+            self._key = hkdf.derive(password)
+            self._key_sig = sig
+        return self._key
+
+    def available(self) -> bool:
+        """Sin contraseña del Vault no hay clave: nunca escribimos en claro."""
+        try:
+            self._derive_key()
+            return True
+        except (OSError, InventoryError) as e:
+            logger.warning(f"Shared snapshot disabled: {e}")
+            return False
+
+    # --- Propietario (flock) ---
+
+    @property
+    def is_owner(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_acquire(self) -> bool:
+        """Intenta ser el propietario. El lock se libera solo si el proceso muere."""
+        if self._lock_fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info(f"Inventory owner (pid {os.getpid()})")
+        return True
+
+    def release(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def request_reload(self):
+        """Un seguidor pide al propietario una recarga (POST /inventory/refresh)."""
+        self.reload_path.touch()
+
+    def take_reload_request(self) -> bool:
+        try:
+            self.reload_path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    # --- Publicación y lectura ---
+
+    def publish(self, snapshot: InventorySnapshot):
+        """Escritura atómica: archivo temporal + fsync + os.replace."""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        payload = json.dumps(
+            {"loaded_at": snapshot.loaded_at.isoformat(), "data": snapshot.to_data()},
+            separators=(",", ":"),
+            default=str,
+        ).encode()
+        nonce = os.urandom(12)
+        header = HEADER.pack(MAGIC, snapshot.generation, nonce)
+        body = AESGCM(self._derive_key()).encrypt(nonce, zlib.compress(payload, 6), header[:16])
+
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, header)
+            os.write(fd, body)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, self.path)
+        self._seen = self._signature()
+        self.published += 1
+        logger.info(
+            f"Published inventory generation {snapshot.generation} "
+            f"({len(payload)} -> {HEADER.size + len(body)} bytes)"
+        )
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def changed(self) -> bool:
+        """¿Hay una publicación que aún no hemos leído? (un stat, sin abrir)."""
+        sig = self._signature()
+        return sig is not None and sig != self._seen
+
+    def read(self, previous: Optional[InventorySnapshot] = None) -> Optional[InventorySnapshot]:
+        """
+        Lee el snapshot publicado. Retorna None si no existe o no es válido
+        (corrupto, de otra versión o cifrado con otra contraseña). Con
+        `previous` se construye como diff contra la generación que ya servimos.
+        """
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        sig = self._signature()
+        if sig is None:
+            return None
+        try:
+            with open(self.path, "rb") as fh, mmap.mmap(
+                fh.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm:
+                header = mm[: HEADER.size]
+                magic, generation, nonce = HEADER.unpack(header)
+                if magic != MAGIC:
+                    raise ValueError("bad magic")
+                compressed = AESGCM(self._derive_key()).decrypt(
+                    nonce, mm[HEADER.size :], header[:16]
+                )
+            payload = json.loads(zlib.decompress(compressed))
+        except (OSError, ValueError, struct.error, zlib.error, InvalidTag, InventoryError) as e:
+            logger.warning(f"Ignoring shared snapshot {self.path}: {type(e).__name__} {e}")
+            self._seen = sig
+            return None
+
+        self._seen = sig
+        self.adopted += 1
+        snapshot = InventorySnapshot.build(generation, payload["data"], previous)
+        return replace(snapshot, loaded_at=datetime.fromisoformat(payload["loaded_at"]))
+
+    def stats(self):
+        return {
+            "owner": self.is_owner,
+            "published": self.published,
+            "adopted": self.adopted,
+        }
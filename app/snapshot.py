@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger("nexus.snapshot")
+
+
+def freeze(value: Any) -> Any:
+    """Copia de solo lectura: dict -> MappingProxyType, list -> tuple."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Inversa de freeze(): vuelve a tipos JSON planos."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+def build_machine_index(
+    hostvars: Mapping[str, Mapping[str, Any]],
+) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Índice inverso nexus_id -> hostname. Los nexus_id duplicados se excluyen
+    del índice (ninguno de esos hosts recibe configuración) y se reportan.
+    """
+    owners: Dict[str, List[str]] = {}
+    for hostname, host_vars in hostvars.items():
+        nexus_id = host_vars.get("nexus_id")
+        if nexus_id:
+            owners.setdefault(nexus_id, []).append(hostname)
+
+    index = {nid: hosts[0] for nid, hosts in owners.items() if len(hosts) == 1}
+    duplicates = {nid: hosts for nid, hosts in owners.items() if len(hosts) > 1}
+    for nid, hosts in duplicates.items():
+        logger.error(f"Duplicate nexus_id {nid} in inventory: {', '.join(hosts)}")
+    return index, duplicates
+
+
+def canonical(value: Any) -> str:
+    """
+    JSON canónico de un valor. Compara por tipo, a diferencia de `==`:
+    1, True y 1.0 son valores distintos en una plantilla.
+    """
+    return json.dumps(thaw(value), sort_keys=True, default=str)
+
+
+def vars_digest(host_vars: Mapping[str, Any]) -> str:
+    return hashlib.sha256(canonical(host_vars).encode()).hexdigest()
+
+
+def changed_keys(old: Mapping[str, Any], new: Mapping[str, Any]) -> Tuple[str, ...]:
+    """Claves añadidas, quitadas o con otro valor (comparación por JSON canónico)."""
+    return tuple(
+        sorted(
+            k
+            for k in old.keys() | new.keys()
+            if k not in old or k not in new or canonical(old[k]) != canonical(new[k])
+        )
+    )
+
+
+@dataclass(frozen=True)
+class InventoryDiff:
+    """
+    Cambios entre dos generaciones, por host y por clave. Como las hostvars ya
+    vienen combinadas (group_vars incluidas), tocar un group_vars solo marca
+    los hosts de ese grupo.
+    """
+
+    from_generation: int
+    to_generation: int
+    added: Tuple[str, ...]
+    removed: Tuple[str, ...]
+    changed: Mapping[str, Tuple[str, ...]]  # hostname -> claves cambiadas
+    all_vars: Tuple[str, ...]  # Claves cambiadas en all.vars
+
+    @property
+    def hosts(self) -> frozenset:
+        """Hosts cuyo estado derivado (scripts, digests) deja de valer."""
+        return frozenset(self.added) | frozenset(self.removed) | frozenset(self.changed)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed or self.all_vars)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "from_generation": self.from_generation,
+            "to_generation": self.to_generation,
+            "added": list(self.added),
+            "removed": list(self.removed),
+            "changed": {h: list(keys) for h, keys in self.changed.items()},
+            "all_vars": list(self.all_vars),
+        }
+
+
+def diff_hostvars(
+    previous: "InventorySnapshot", new: Mapping[str, Mapping[str, Any]]
+) -> Tuple[Tuple[str, ...], Tuple[str, ...], Dict[str, Tuple[str, ...]], Dict[str, str]]:
+    """
+    (añadidos, quitados, cambiados, digests) entre la generación anterior y
+    unas hostvars congeladas nuevas. Un host cambia si cambia su digest (el
+    de la generación anterior se reutiliza si ya estaba calculado); los
+    digests nuevos se retornan para no recalcularlos en la petición.
+    """
+    old = previous.hostvars
+    added = tuple(sorted(new.keys() - old.keys()))
+    removed = tuple(sorted(old.keys() - new.keys()))
+    changed: Dict[str, Tuple[str, ...]] = {}
+    digests: Dict[str, str] = {}
+    for hostname, host_vars in new.items():
+        digests[hostname] = vars_digest(host_vars)
+        if hostname in old and digests[hostname] != previous.host_digest(hostname):
+            changed[hostname] = changed_keys(old[hostname], host_vars)
+    return added, removed, dict(sorted(changed.items())), digests
+
+
+@dataclass(frozen=True)
+class InventorySnapshot:
+    """Resultado inmutable de una carga de inventario, versionado por generación."""
+
+    generation: int
+    hostvars: Mapping[str, Mapping[str, Any]]
+    all_vars: Mapping[str, Any]
+    machine_index: Mapping[str, str]
+    duplicate_nexus_ids: Mapping[str, List[str]]
+    loaded_at: datetime
+    # Memo de digests por host (derivado, nunca forma parte del inventario)
+    _digests: Dict[str, str] = field(default_factory=dict, compare=False, repr=False)
+    # Cambios respecto a la generación anterior (None = carga completa)
+    diff: Optional[InventoryDiff] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def build(
+        cls,
+        generation: int,
+        data: Dict[str, Any],
+        previous: Optional["InventorySnapshot"] = None,
+    ) -> "InventorySnapshot":
+        """
+        Construye un snapshot desde la salida de `ansible-inventory --list`.
+        Con `previous`, los hosts sin cambios comparten sus hostvars congeladas
+        con la generación anterior, los digests quedan calculados (sirven para
+        el diff) y el índice de nexus_id solo se recalcula si algún cambio toca
+        un nexus_id.
+        """
+        hostvars = freeze(data.get("_meta", {}).get("hostvars", {}))
+        all_vars = freeze(data.get("all", {}).get("vars", {}))
+        if previous is None:
+            machine_index, duplicates = build_machine_index(hostvars)
+            return cls(
+                generation=generation,
+                hostvars=hostvars,
+                all_vars=all_vars,
+                machine_index=MappingProxyType(machine_index),
+                duplicate_nexus_ids=MappingProxyType(duplicates),
+                loaded_at=datetime.now(),
+            )
+
+        added, removed, changed, digests = diff_hostvars(previous, hostvars)
+        diff = InventoryDiff(
+            from_generation=previous.generation,
+            to_generation=generation,
+            added=added,
+            removed=removed,
+            changed=MappingProxyType(changed),
+            all_vars=changed_keys(previous.all_vars, all_vars),
+        )
+        # Compartición estructural: los hosts intactos apuntan a la versión anterior
+        shared = {
+            h: previous.hostvars[h] if h in previous.hostvars and h not in changed else v
+            for h, v in hostvars.items()
+        }
+
+        touches_ids = (
+            any("nexus_id" in keys for keys in changed.values())
+            or any("nexus_id" in hostvars[h] for h in added)
+            or any("nexus_id" in previous.hostvars[h] for h in removed)
+        )
+        if touches_ids:
+            machine_index, duplicates = build_machine_index(shared)
+            machine_index = MappingProxyType(machine_index)
+            duplicates = MappingProxyType(duplicates)
+        else:
+            machine_index, duplicates = previous.machine_index, previous.duplicate_nexus_ids
+
+        return cls(
+            generation=generation,
+            hostvars=MappingProxyType(shared),
+            all_vars=previous.all_vars if not diff.all_vars else all_vars,
+            machine_index=machine_index,
+            duplicate_nexus_ids=duplicates,
+            loaded_at=datetime.now(),
+            _digests=digests,
+            diff=diff,
+        )
+
+    def to_data(self) -> Dict[str, Any]:
+        """Inversa de build(): formato de `ansible-inventory --list`."""
+        return {
+            "_meta": {"hostvars": thaw(self.hostvars)},
+            "all": {"vars": thaw(self.all_vars)},
+        }
+
+    def host_digest(self, hostname: str) -> str:
+        """Digest estable de las hostvars de un host en esta generación."""
+        digest = self._digests.get(hostname)
+        if digest is None:
+            digest = vars_digest(self.hostvars[hostname])
+            self._digests[hostname] = digest
+        return digest
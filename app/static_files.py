@@ -0,0 +1,118 @@
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from .cache import ByteLRU
+from .file_index import FileHashIndex
+
+logger = logging.getLogger("nexus.files")
+
+
+def is_served(path: str) -> bool:
+    """Ocultos y backups de editor nunca se sirven (ni disparan el watcher)."""
+    name = os.path.basename(path)
+    return not name.startswith(".") and not name.endswith("~")
+
+
+@dataclass(frozen=True)
+class StaticEntry:
+    path: str
+    size: int
+    content_hash: str
+    media_type: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.content_hash}"'
+
+
+class StaticFiles:
+    """
+    Archivos servidos por /scripts, /skels y /certs.
+
+    La lista blanca (tipo, ruta relativa) -> entrada se calcula al arrancar y
+    tras cada cambio en files/: una petición solo consulta un dict, sin
+    resolve() ni stat. Los cuerpos de hasta `max_file_bytes` viven en una LRU
+    acotada por hash de contenido (dos archivos iguales ocupan una vez); los
+    mayores se sirven desde disco con FileResponse.
+    """
+
+    def __init__(self, indexes: Mapping[str, FileHashIndex], max_bytes: int, max_file_bytes: int):
+        self.indexes = indexes
+        self.max_file_bytes = max_file_bytes
+        self.bodies = ByteLRU(max_bytes)
+        self._entries: Dict[Tuple[str, str], StaticEntry] = {}
+
+    def scan(self) -> int:
+        """
+        Reconstruye la lista blanca. Los enlaces que salen del directorio base
+        se descartan aquí; los hashes solo se recalculan si cambió la firma.
+        """
+        entries: Dict[Tuple[str, str], StaticEntry] = {}
+        for kind, index in self.indexes.items():
+            base = index.base_dir.resolve()
+            if not base.is_dir():
+                continue
+            for root, dirs, files in os.walk(base):
+                dirs[:] = [d for d in dirs if is_served(d)]
+                for name in files:
+                    full = Path(root, name)
+                    if not is_served(name):
+                        continue
+                    target = full.resolve()
+                    if not target.is_relative_to(base) or not target.is_file():
+                        logger.warning(f"Not serving {full}: outside {base}")
+                        continue
+                    rel = full.relative_to(base).as_posix()
+                    content_hash = index.get(rel)
+                    if not content_hash:
+                        continue
+                    entries[(kind, rel)] = StaticEntry(
+                        path=str(target),
+                        size=target.stat().st_size,
+                        content_hash=content_hash,
+                        media_type=mimetypes.guess_type(name)[0] or "text/plain",
+                    )
+        self._entries = entries  # Intercambio atómico
+        self._preload()
+        logger.info(f"Static files: {len(entries)} served, {self.bodies.bytes} bytes cached")
+        return len(entries)
+
+    def _preload(self):
+        for entry in self._entries.values():
+            if entry.size > self.max_file_bytes or self.bodies.get(entry.content_hash) is not None:
+                continue
+            if self.bodies.bytes + entry.size > self.bodies.max_bytes:
+                break  # Lo que no cabe se carga bajo demanda
+            self._load(entry)
+
+    def _load(self, entry: StaticEntry) -> Optional[bytes]:
+        try:
+            with open(entry.path, "rb") as fh:
+                body = fh.read()
+        except FileNotFoundError:
+            return None  # Borrado antes de que el watcher lo notifique
+        self.bodies.put(entry.content_hash, body, len(body))
+        return body
+
+    def lookup(self, kind: str, rel_path: str) -> Optional[StaticEntry]:
+        return self._entries.get((kind, rel_path))
+
+    def cached(self, entry: StaticEntry) -> Optional[bytes]:
+        """Contenido si ya está en memoria (sin tocar el disco)."""
+        if entry.size > self.max_file_bytes:
+            return None
+        return self.bodies.get(entry.content_hash)
+
+    def body(self, entry: StaticEntry) -> Optional[bytes]:
+        """Contenido en memoria, o None si supera el límite (se sirve desde disco)."""
+        if entry.size > self.max_file_bytes:
+            return None
+        cached = self.bodies.get(entry.content_hash)
+        return cached if cached is not None else self._load(entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {"files": len(self._entries), **self.bodies.stats()}
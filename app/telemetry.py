@@ -0,0 +1,435 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from .config import get_settings
+from .metrics import db_commit_seconds, telemetry_flush_seconds
+from .models import Machine, MachineReport, NodeStatus, TelemetryPoint, engine, run_db
+
+logger = logging.getLogger("nexus.telemetry")
+
+Report = Dict[str, Any]  # Fila de Machine para el upsert
+Blob = Dict[str, Any]  # Fila de MachineReport (solo informes completos)
+Point = Dict[str, Any]  # Fila de TelemetryPoint (histórico)
+Entry = Tuple[Report, Optional[Blob], Optional[Point]]
+
+# Resoluciones del histórico (segundos que cubre cada punto)
+RAW, HOURLY, DAILY = 0, 3600, 86400
+# Filas por transacción al borrar puntos caducados
+EXPIRE_CHUNK_ROWS = 5000
+
+
+def build_report(data: Dict[str, Any], client_ip: str) -> Entry:
+    """
+    Fila lista para el upsert a partir del JSON de /record, más el último
+    informe (log y JSON) y su punto de histórico. Un latido (sin "log") no
+    lleva informe: conserva el último, así como su ip y mac.
+    """
+    m_id = data["machine_id"]
+    has_log = "log" in data
+    full_log = data.pop("log", "")  # Optimización: evitar duplicidad en report_data
+    now = datetime.now()
+    point = None
+    if get_settings().nexus_telemetry_history:
+        point = {
+            "machine_id": m_id,
+            "timestamp": now,
+            "resolution": RAW,
+            "reports": 1 if has_log else 0,
+            "heartbeats": 0 if has_log else 1,
+            "log_bytes": len(full_log),
+            "ip": data.get("ip"),
+            "mac": data.get("mac"),
+            "vpn": data.get("vpn"),
+            "via": client_ip,
+        }
+    report = {
+        "nodo": f"supplicant_{m_id[:8]}",
+        "machine_id": m_id,
+        "fingerprint": data["fingerprint"],
+        "status": NodeStatus.pending,
+        "ip": data.get("ip") if has_log else None,
+        "mac": data.get("mac") if has_log else None,
+        "via": client_ip,
+        "fecha": now,
+    }
+    blob = None
+    if has_log:
+        blob = {
+            "machine_id": m_id,
+            "report_data": json.dumps(data),
+            "last_log": full_log,
+            "fecha": now,
+        }
+    return report, blob, point
+
+
+def _upsert_statement(heartbeat: bool):
+    """
+    INSERT ... ON CONFLICT(machine_id): nombre, huella y estado no se tocan.
+    Un latido solo actualiza via y fecha; un informe completo, también ip y mac.
+    """
+    table = Machine.__table__
+    stmt = sqlite_insert(table)
+    new = stmt.excluded
+    columns = ("via", "fecha") if heartbeat else ("ip", "mac", "via", "fecha")
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.machine_id],
+        set_={c: new[c] for c in columns},
+    )
+
+
+def _report_statement():
+    """Último informe por nodo: una fila por machine_id, sobrescrita."""
+    table = MachineReport.__table__
+    stmt = sqlite_insert(table)
+    new = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.machine_id],
+        set_={c: new[c] for c in ("report_data", "last_log", "fecha")},
+    )
+
+
+class TelemetryWriter:
+    """
+    Cola de escritura diferida para /record: los informes se aceptan al
+    instante y un escritor en segundo plano los vuelca en lotes (un único
+    upsert y un único commit por ventana).
+    """
+
+    def __init__(self, batch_size: int, latency_ms: int, queue_max: int):
+        self.batch_size = batch_size
+        self.latency = latency_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+        self._wakeup = asyncio.Event()
+        self._urgent = asyncio.Event()
+        self._written_cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, int] = {}  # machine_id -> informes en cola
+        self._submitted = 0
+        self._written = 0
+        self._upserts = {hb: _upsert_statement(hb) for hb in (False, True)}
+        self._report_statement = _report_statement()
+        # Métricas
+        self.batches = 0
+        self.failed = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="nexus-telemetry-writer")
+        logger.info(
+            f"Telemetry writer started (batch {self.batch_size}, "
+            f"latency {self.latency * 1000:.0f}ms)"
+        )
+
+    async def stop(self):
+        """Apagado ordenado: vacía la cola antes de parar el escritor."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Telemetry writer stopped ({self._written} reports written)")
+
+    async def submit(self, entry: Entry):
+        if self._task is None:
+            # Sin escritor (scripts, arranque incompleto): escritura directa
+            await run_db(self._write_batch, [entry])
+            return
+        m_id = entry[0]["machine_id"]
+        self._pending[m_id] = self._pending.get(m_id, 0) + 1
+        self._submitted += 1
+        # Si la cola está llena el cliente espera (contrapresión), no se pierde
+        await self._queue.put(entry)
+        self._wakeup.set()
+
+    def is_pending(self, machine_id: str) -> bool:
+        return machine_id in self._pending
+
+    async def flush(self):
+        """Espera a que todo lo encolado hasta ahora esté en la base de datos."""
+        target = self._submitted
+        if self._written >= target or self._task is None:
+            return
+        self._urgent.set()
+        self._wakeup.set()
+        async with self._written_cond:
+            await self._written_cond.wait_for(lambda: self._written >= target)
+
+    async def _collect(self) -> List[Entry]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.latency
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._urgent.is_set():
+                break
+            # Esperamos más informes o una petición de flush, lo que llegue antes
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            start = time.perf_counter()
+            try:
+                await run_db(self._write_batch, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Telemetry batch of {len(batch)} lost: {e}")
+            elapsed = (time.perf_counter() - start) * 1000
+            telemetry_flush_seconds.observe(elapsed / 1000)
+            self.batches += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self.total_flush_ms += elapsed
+
+            for report, _, _ in batch:
+                m_id = report["machine_id"]
+                left = self._pending.get(m_id, 1) - 1
+                if left > 0:
+                    self._pending[m_id] = left
+                else:
+                    self._pending.pop(m_id, None)
+            async with self._written_cond:
+                self._written += len(batch)
+                if self._written >= self._submitted:
+                    self._urgent.clear()
+                self._written_cond.notify_all()
+
+    def _write_entries(self, entries: List[Entry]):
+        """Upsert de Machine, último informe e histórico en la misma transacción."""
+        blobs = [blob for _, blob, _ in entries if blob]
+        points = [point for _, _, point in entries if point]
+        with db_commit_seconds.time(op="telemetry"), engine.begin() as conn:
+            # Tramos consecutivos de latidos o de informes, en orden de llegada
+            for heartbeat, run in itertools.groupby(entries, key=lambda e: e[1] is None):
+                conn.execute(self._upserts[heartbeat], [report for report, _, _ in run])
+            if blobs:
+                conn.execute(self._report_statement, blobs)
+            if points:
+                conn.execute(insert(TelemetryPoint.__table__), points)
+
+    def _write_batch(self, batch: List[Entry]):
+        try:
+            self._write_entries(batch)
+        except IntegrityError:
+            # Una fila conflictiva (p. ej. nombre de supplicant repetido) no
+            # debe tumbar al resto del lote: reintento fila a fila
+            for entry in batch:
+                try:
+                    self._write_entries([entry])
+                except IntegrityError as e:
+                    self.failed += 1
+                    logger.error(f"Record rejected for {entry[0]['machine_id']}: {e.orig}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "pending_machines": len(self._pending),
+            "submitted": self._submitted,
+            "written": self._written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 2)
+            if self.batches
+            else 0.0,
+        }
+
+
+def _bucket(ts: datetime, resolution: int) -> datetime:
+    """Inicio del periodo (hora o día) al que pertenece un instante."""
+    if resolution == DAILY:
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class TelemetryHistory:
+    """
+    Retención del histórico: los puntos crudos pasan a horarios tras
+    `raw_days`, los horarios a diarios tras `hourly_days` y los más antiguos
+    que `retention_days` se borran.
+
+    Cada periodo agregado (una hora o un día de toda la flota) y cada lote de
+    borrado va en su propia transacción: el lock de escritura de SQLite nunca
+    se retiene durante todo el histórico y /record puede escribir entre medias.
+    """
+
+    def __init__(self, raw_days: int, hourly_days: int, retention_days: int, interval: float):
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.retention_days = retention_days
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="nexus-telemetry-retention")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await run_db(self.compact)
+                if any(result.values()):
+                    logger.info(f"Telemetry retention: {result}")
+            except Exception as e:
+                logger.error(f"Telemetry retention failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.now()
+        # Cortes alineados al periodo: nunca se agrega un periodo a medias
+        hourly = self._downsample(
+            RAW, HOURLY, _bucket(now - timedelta(days=self.raw_days), HOURLY)
+        )
+        daily = self._downsample(
+            HOURLY, DAILY, _bucket(now - timedelta(days=self.hourly_days), DAILY)
+        )
+        expired = self._expire(now - timedelta(days=self.retention_days))
+        return {"to_hourly": hourly, "to_daily": daily, "expired": expired}
+
+    @classmethod
+    def _downsample(cls, source: int, target: int, cutoff: datetime) -> int:
+        """Agrega periodo a periodo, del más antiguo al corte."""
+        table = TelemetryPoint.__table__
+        pending = (table.c.resolution == source) & (table.c.timestamp < cutoff)
+        count = 0
+        while True:
+            with db_commit_seconds.time(op="compact"), engine.begin() as conn:
+                # Índice (resolution, timestamp): el más antiguo sin recorrer la tabla
+                oldest = conn.execute(select(func.min(table.c.timestamp)).where(pending)).scalar()
+                if oldest is None:
+                    return count
+                start = _bucket(oldest, target)
+                end = min(start + timedelta(seconds=target), cutoff)
+                count += cls._downsample_period(conn, source, target, start, end)
+
+    @staticmethod
+    def _downsample_period(conn, source: int, target: int, start: datetime, end: datetime) -> int:
+        table = TelemetryPoint.__table__
+        old = (
+            (table.c.resolution == source)
+            & (table.c.timestamp >= start)
+            & (table.c.timestamp < end)
+        )
+        rows = conn.execute(
+            select(table).where(old).order_by(table.c.machine_id, table.c.timestamp)
+        ).mappings()
+
+        buckets: Dict[Tuple[str, datetime], Point] = {}
+        count = 0
+        for row in rows:
+            count += 1
+            key = (row["machine_id"], _bucket(row["timestamp"], target))
+            agg = buckets.setdefault(
+                key,
+                {
+                    "machine_id": key[0],
+                    "timestamp": key[1],
+                    "resolution": target,
+                    "reports": 0,
+                    "heartbeats": 0,
+                    "log_bytes": 0,
+                    "ip": None,
+                    "mac": None,
+                    "vpn": None,
+                    "via": None,
+                },
+            )
+            agg["reports"] += row["reports"]
+            agg["heartbeats"] += row["heartbeats"]
+            agg["log_bytes"] = max(agg["log_bytes"], row["log_bytes"])
+            # Orden cronológico: el agregado se queda con el último valor visto
+            for field in ("ip", "mac", "vpn", "via"):
+                if row[field] is not None:
+                    agg[field] = row[field]
+
+        if count:
+            conn.execute(delete(table).where(old))
+            conn.execute(insert(table), list(buckets.values()))
+        return count
+
+    @staticmethod
+    def _expire(cutoff: datetime) -> int:
+        """Borra lo anterior a `cutoff` por resolución y en lotes acotados."""
+        table = TelemetryPoint.__table__
+        expired = 0
+        for resolution in (RAW, HOURLY, DAILY):
+            batch = (
+                select(table.c.id)
+                .where(table.c.resolution == resolution, table.c.timestamp < cutoff)
+                .limit(EXPIRE_CHUNK_ROWS)
+            )
+            while True:
+                with db_commit_seconds.time(op="compact"), engine.begin() as conn:
+                    deleted = conn.execute(
+                        delete(table).where(table.c.id.in_(batch.scalar_subquery()))
+                    ).rowcount
+                expired += deleted
+                if deleted < EXPIRE_CHUNK_ROWS:
+                    break
+        return expired
+
+    def query(
+        self, machine_id: str, start: datetime, end: datetime, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Puntos de un nodo en [start, end], en orden cronológico."""
+        table = TelemetryPoint.__table__
+        statement = (
+            select(table)
+            .where(
+                table.c.machine_id == machine_id,
+                table.c.timestamp >= start,
+                table.c.timestamp <= end,
+            )
+            .order_by(table.c.timestamp)
+            .limit(limit)
+        )
+        with engine.connect() as conn:
+            rows = conn.execute(statement).mappings().all()
+        return [{k: v for k, v in row.items() if k != "id"} for row in rows]
+
+
+telemetry = TelemetryWriter(
+    get_settings().nexus_record_batch_size,
+    get_settings().nexus_record_batch_latency_ms,
+    get_settings().nexus_record_queue_max,
+)
+history = TelemetryHistory(
+    get_settings().nexus_telemetry_raw_days,
+    get_settings().nexus_telemetry_hourly_days,
+    get_settings().nexus_telemetry_retention_days,
+    get_settings().nexus_telemetry_compact_interval,
+)
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("nexus.watcher")
+
+# Extensiones que Ansible considera archivos de variables ("" = sin extensión)
+WATCHED_EXTENSIONS = ("", ".yml", ".yaml", ".json")
+
+ChangeCallback = Callable[[Set[str]], Awaitable[None]]
+
+
+def is_watched(path: str) -> bool:
+    """Ignora ocultos, backups de editor y extensiones que Ansible no carga."""
+    name = os.path.basename(path)
+    if name.startswith(".") or name.endswith("~"):
+        return False
+    return os.path.splitext(name)[-1] in WATCHED_EXTENSIONS
+
+
+class InventoryWatcher:
+    """
+    Vigila directorios y dispara un callback por cada lote de cambios.
+    Usa inotify (vía watchfiles) y, si no está disponible, un sondeo por stat
+    que también detecta archivos borrados.
+    """
+
+    def __init__(
+        self,
+        paths: List[Path],
+        on_change: ChangeCallback,
+        mode: str = "auto",
+        debounce_ms: int = 500,
+        poll_interval: float = 2.0,
+        watch_filter: Callable[[str], bool] = is_watched,
+        name: str = "Inventory",
+    ):
+        self.paths = paths
+        self.on_change = on_change
+        self.watch_filter = watch_filter
+        self.name = name
+        self.mode = mode
+        self.debounce_ms = debounce_ms
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> Optional[asyncio.Task]:
+        if self.mode == "off":
+            logger.info(f"{self.name} watcher disabled")
+            return None
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run(), name=f"nexus-{self.name.lower()}-watcher")
+        return self._task
+
+    async def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._task:
+            # awatch consulta stop_event y sale solo; cancelarlo sin más deja el
+            # hilo nativo de watchfiles vivo y el intérprete cae al salir
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+
+    async def _run(self):
+        if self.mode in ("auto", "inotify"):
+            try:
+                import watchfiles  # noqa: F401  (llega con uvicorn[standard])
+
+                await self._run_watchfiles()
+                return
+            except ImportError:
+                if self.mode == "inotify":
+                    logger.error("watchfiles not installed, falling back to polling")
+            except Exception as e:
+                # Límite de watches de inotify, FS sin soporte...: sin este
+                # respaldo no habría recargas hasta que venciera el TTL
+                logger.error(
+                    f"{self.name} watcher failed ({type(e).__name__}: {e}), "
+                    "falling back to polling"
+                )
+            if self._stop.is_set():
+                return
+        await self._run_polling()
+
+    async def _dispatch(self, changed: Set[str]):
+        try:
+            await self.on_change(changed)
+        except Exception as e:
+            # Un YAML a medio editar no debe matar al watcher
+            logger.error(f"{self.name} reload after change failed: {e}")
+
+    async def _run_watchfiles(self):
+        from watchfiles import awatch
+
+        self.backend = "inotify"
+        logger.info(f"{self.name} watcher started (inotify) on {self.paths}")
+        async for changes in awatch(
+            *self.paths,
+            watch_filter=lambda _change, path: self.watch_filter(path),
+            debounce=self.debounce_ms,
+            stop_event=self._stop,
+        ):
+            await self._dispatch({path for _, path in changes})
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        state: Dict[str, Tuple[int, int]] = {}
+        for base in self.paths:
+            for root, _, files in os.walk(base):
+                for f in files:
+                    path = os.path.join(root, f)
+                    if not self.watch_filter(path):
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    @staticmethod
+    def _diff(old: Dict[str, Tuple[int, int]], new: Dict[str, Tuple[int, int]]) -> Set[str]:
+        return {p for p in old.keys() | new.keys() if old.get(p) != new.get(p)}
+
+    async def _stopped_within(self, seconds: float) -> bool:
+        """Duerme `seconds` o hasta que se pida parar (True si se pidió)."""
+        try:
+            await asyncio.wait_for(self._stop.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run_polling(self):
+        self.backend = "poll"
+        logger.info(f"{self.name} watcher started (polling {self.poll_interval}s)")
+        state = await asyncio.to_thread(self._snapshot)
+        while not await self._stopped_within(self.poll_interval):
+            current = await asyncio.to_thread(self._snapshot)
+            changed = self._diff(state, current)
+            if not changed:
+                continue
+            # Debounce: esperamos a que la ráfaga de ediciones se estabilice
+            while True:
+                await asyncio.sleep(self.debounce_ms / 1000)
+                settled = await asyncio.to_thread(self._snapshot)
+                if settled == current:
+                    break
+                changed |= self._diff(current, settled)
+                current = settled
+            state = current
+            await self._dispatch(changed)
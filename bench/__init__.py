@@ -0,0 +1,12 @@
+"""
+Banco de pruebas de rendimiento de Nexus (desde la raíz del proyecto):
+
+    uv run python -m bench.fleet /tmp/flota --hosts 500   # solo generar inventario
+    uv run python -m bench.load --hosts 500 --concurrency 32
+    uv run python -m bench.micro --hosts 500
+    uv run python -m bench.compare output/bench/a.json output/bench/b.json
+
+Cada ejecución genera una flota sintética en un directorio temporal, trabaja
+allí (la app lee inventory/, files/, templates/ y .env del directorio actual)
+y guarda el resultado en output/bench/ como JSON.
+"""
@@ -0,0 +1,103 @@
+"""Piezas compartidas: directorio de trabajo, percentiles, RSS y guardado."""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from .fleet import REPO_ROOT, generate_fleet
+
+
+def add_fleet_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--hosts", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, help="directorio de la flota (por defecto, temporal)")
+    parser.add_argument("--keep", action="store_true", help="no borrar la flota al terminar")
+    parser.add_argument("--out", type=Path, default=REPO_ROOT / "output" / "bench")
+
+
+@contextmanager
+def fleet_workdir(args: argparse.Namespace) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Genera la flota y trabaja dentro de ella. La app se importa después de
+    entrar: sus singletons leen .env, inventory/ y templates/ del cwd.
+    """
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="nexus-bench-"))
+    fleet = generate_fleet(workdir.resolve(), hosts=args.hosts, groups=args.groups, seed=args.seed)
+    previous = Path.cwd()
+    os.chdir(workdir)
+    try:
+        yield fleet
+    finally:
+        os.chdir(previous)
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    values = sorted(s * 1000 for s in seconds)
+    return {
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss: KiB en Linux, bytes en macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return round(rss / divisor, 1)
+
+
+def _git(*cmd: str) -> str:
+    try:
+        out = subprocess.run(
+            ["git", *cmd], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_results(kind: str, args: argparse.Namespace, results: Dict[str, Any]) -> Path:
+    """Guarda el resultado con el commit y el entorno, para comparar entre commits."""
+    commit = _git("rev-parse", "HEAD")
+    params = {
+        k: str(v) if isinstance(v, Path) else v
+        for k, v in vars(args).items()
+        if k not in ("out", "workdir", "keep")
+    }
+    document = {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+        "params": params,
+        "results": results,
+    }
+    args.out.mkdir(parents=True, exist_ok=True)
+    path = args.out / f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}-{commit[:8] or 'nogit'}.json"
+    path.write_text(json.dumps(document, indent=2))
+    return path
@@ -0,0 +1,52 @@
+"""Compara dos resultados de bench (mismo tipo) métrica a métrica."""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+# Métricas donde subir es mejorar (en el resto, subir es empeorar)
+HIGHER_IS_BETTER = ("throughput_rps", "hosts_per_s", "mb_per_s")
+# Parámetros y recuentos, no métricas
+SKIP = ("status_codes", "requests", "concurrency", "calls_per_round", "hosts", "fragment_cache")
+# Variación por debajo de la cual no se marca nada (ruido)
+NOISE = 0.05
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        key = prefix.rstrip(".")
+        if not any(part in SKIP for part in key.split(".")):
+            flat[key] = float(data)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos JSON de output/bench.")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("new", type=Path)
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text())
+    new = json.loads(args.new.read_text())
+    if base["kind"] != new["kind"]:
+        parser.error(f"tipos distintos: {base['kind']} vs {new['kind']}")
+    if base["params"] != new["params"]:
+        print("⚠️  Parámetros distintos: la comparación puede no ser válida")
+
+    print(f"{base['commit'][:8]} -> {new['commit'][:8]}{' (dirty)' if new['dirty'] else ''}")
+    old_flat, new_flat = flatten(base["results"]), flatten(new["results"])
+    for key in sorted(set(old_flat) & set(new_flat)):
+        a, b = old_flat[key], new_flat[key]
+        change = (b - a) / a if a else 0.0
+        better = change > 0 if key.endswith(HIGHER_IS_BETTER) else change < 0
+        mark = "" if abs(change) < NOISE else (" ✅" if better else " ❌")
+        print(f"  {key:<45} {a:>12.2f} -> {b:>12.2f}  {change:+7.1%}{mark}")
+
+
+if __name__ == "__main__":
+    main()
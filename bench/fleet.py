@@ -0,0 +1,244 @@
+"""
+Generador de flota sintética: un árbol inventory/ + files/ + templates/
+con N hosts repartidos en M grupos, listo para arrancar Nexus encima.
+"""
+
+import argparse
+import binascii
+import hashlib
+import hmac
+import os
+import random
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import yaml
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+API_KEY = "bench-key"
+VAULT_PASSWORD = b"bench-vault"
+
+FULL_WORKFLOW = [
+    "base/header",
+    "tasks/00-persistence",
+    "tasks/01-hosts",
+    "tasks/02-sshd",
+    "tasks/03-password",
+    "tasks/04-keys",
+    "tasks/05-auth",
+    "tasks/06-scripts",
+    "tasks/07-skels",
+    "tasks/08-ssl",
+    "tasks/99-clean",
+    "base/footer",
+]
+# Workflow reducido (estilo gv_synology): sin sshd, llaves ni auth
+LIGHT_WORKFLOW = [
+    t for t in FULL_WORKFLOW if t not in ("tasks/02-sshd", "tasks/04-keys", "tasks/05-auth")
+]
+CERT_FILES = ("cert.pem", "privkey.pem", "chain.pem", "fullchain.pem")
+
+
+def encrypt_vault(plaintext: bytes, password: bytes) -> bytes:
+    """Cifrado $ANSIBLE_VAULT;1.1;AES256 (inverso de app.inventory.decrypt_vault)."""
+    salt = os.urandom(32)
+    derived = hashlib.pbkdf2_hmac("sha256", password, salt, 10000, dklen=80)
+    key1, key2, iv = derived[:32], derived[32:64], derived[64:80]
+
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(plaintext) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key1), modes.CTR(iv)).encryptor()
+    ciphertext = encryptor.update(padded) + encryptor.finalize()
+    mac = hmac.new(key2, ciphertext, hashlib.sha256).hexdigest().encode()
+
+    body = binascii.hexlify(
+        b"\n".join([binascii.hexlify(salt), mac, binascii.hexlify(ciphertext)])
+    )
+    lines = [body[i : i + 80] for i in range(0, len(body), 80)]
+    return b"\n".join([b"$ANSIBLE_VAULT;1.1;AES256", *lines]) + b"\n"
+
+
+def _write_yaml(path: Path, data: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump(data, sort_keys=False, allow_unicode=True))
+
+
+def _fake_text(rng: random.Random, size: int, prefix: str = "") -> str:
+    """Contenido de relleno con forma de script (líneas, comentarios, vacías)."""
+    lines = [prefix] if prefix else []
+    total = 0
+    while total < size:
+        kind = rng.random()
+        if kind < 0.15:
+            line = f"# comentario {rng.getrandbits(32):08x}"
+        elif kind < 0.25:
+            line = ""
+        else:
+            line = f"    echo \"paso {rng.getrandbits(24)}\" >> /var/log/nexus-bench.log"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def _fake_pem(rng: random.Random, label: str) -> str:
+    body = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdef0123456789+/") for _ in range(1600))
+    lines = [body[i : i + 64] for i in range(0, len(body), 64)]
+    return f"-----BEGIN {label}-----\n" + "\n".join(lines) + f"\n-----END {label}-----\n"
+
+
+def generate_fleet(
+    root: Path,
+    hosts: int = 200,
+    groups: int = 8,
+    scripts: int = 20,
+    skels: int = 6,
+    domains: int = 4,
+    users: int = 3,
+    seed: int = 42,
+) -> List[Tuple[str, str]]:
+    """
+    Escribe en `root` inventory/, files/, templates/, .vault_pass y .env.
+    Retorna [(hostname, nexus_id)] de todos los hosts generados.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    inventory = root / "inventory"
+
+    # --- files/: scripts, skels y certificados ---
+    script_names = [f"bench-{i:03d}.sh" for i in range(scripts)]
+    for name in script_names:
+        path = root / "files" / "scripts" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_fake_text(rng, rng.randint(1_000, 20_000), "#!/bin/bash"))
+    skel_names = [f"dot.bench{i:02d}rc" for i in range(skels)]
+    for name in skel_names:
+        path = root / "files" / "skels" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_fake_text(rng, rng.randint(200, 4_000)))
+    domain_names = [f"svc{i:02d}.bench.local" for i in range(domains)]
+    for domain in domain_names:
+        for f in CERT_FILES:
+            path = root / "files" / "certs" / domain / f
+            path.parent.mkdir(parents=True, exist_ok=True)
+            label = "PRIVATE KEY" if f == "privkey.pem" else "CERTIFICATE"
+            path.write_text(_fake_pem(rng, label))
+
+    # --- inventory/group_vars/all ---
+    _write_yaml(
+        inventory / "group_vars" / "all" / "vars.yml",
+        {
+            "registrator_server": "nexus.bench.local",
+            "registrator_port": 80,
+            "domain": "bench.local",
+            "registrator_ip": "10.0.0.5",
+            "nexus_timer_interval": "30min",
+            "nexus_cron_schedule": "*/30 * * * *",
+            "sshd_config_path": "/etc/ssh/sshd_config",
+            "hosts_file_path": "/etc/hosts",
+            "script_bin_path": "/usr/local/sbin",
+            "ssl_base_path": "/etc/ssl/nexus",
+        },
+    )
+    vault_users = {
+        ("root" if i == 0 else f"user{i:02d}"): {
+            "password": f"$6$rounds=656000${rng.getrandbits(48):012x}$" + "x" * 86,
+            "priv_key": _fake_pem(rng, "RSA PRIVATE KEY"),
+            "pub_key": f"ssh-rsa AAAAB3{rng.getrandbits(256):064x} bench",
+        }
+        for i in range(users)
+    }
+    vault = yaml.safe_dump({"vault_users": vault_users, "vault_ssl": {"pkcs12_password": "bench"}})
+    vault_path = inventory / "group_vars" / "all" / "vault.yml"
+    vault_path.write_bytes(encrypt_vault(vault.encode(), VAULT_PASSWORD))
+
+    # --- Grupos: cada uno con su subconjunto de scripts, skels y dominios ---
+    group_names = [f"gv_bench{g:02d}" for g in range(groups)]
+    for g, group in enumerate(group_names):
+        group_scripts: List = rng.sample(script_names, min(len(script_names), rng.randint(3, 8)))
+        if g % 3 == 0:
+            group_scripts.append({"name": "retired.sh", "remove": True})
+        _write_yaml(
+            inventory / "group_vars" / group / "vars.yml",
+            {
+                "system_type": "debian",
+                "ansible_port": 2222,
+                "ssh_auth": True,
+                "nexus_scripts": group_scripts,
+                "nexus_skels": rng.sample(skel_names, min(len(skel_names), 2)),
+                "nexus_ssl": [
+                    {
+                        "domain": d,
+                        "dest_path": f"/etc/ssl/{d.split('.')[0]}",
+                        "generate_combined": True,
+                        "restart_services": ["nginx"],
+                    }
+                    for d in rng.sample(domain_names, min(len(domain_names), 1))
+                ],
+            },
+        )
+        _write_yaml(
+            inventory / "group_vars" / group / "workflow.yml",
+            {"nexus_workflow": FULL_WORKFLOW if g % 4 else LIGHT_WORKFLOW},
+        )
+
+    # --- hosts.yml y host_vars de una fracción de los hosts ---
+    fleet: List[Tuple[str, str]] = []
+    children: Dict[str, Dict] = {group: {"hosts": {}} for group in group_names}
+    for i in range(hosts):
+        hostname = f"bench-{i:05d}"
+        nexus_id = hashlib.md5(f"{seed}-{hostname}".encode()).hexdigest()
+        group = group_names[i % groups]
+        children[group]["hosts"][hostname] = {
+            "nexus_id": nexus_id,
+            "node_ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+        }
+        fleet.append((hostname, nexus_id))
+        if rng.random() < 0.1:
+            _write_yaml(
+                inventory / "host_vars" / f"{hostname}.yml",
+                {
+                    "vpn_ip": f"172.16.{(i >> 8) & 255}.{i & 255}",
+                    "nexus_scripts": [{"name": rng.choice(script_names), "override": True}],
+                },
+            )
+    _write_yaml(inventory / "hosts.yml", {"all": {"children": children}})
+
+    # --- Plantillas del repositorio, contraseña del vault y .env ---
+    shutil.copytree(REPO_ROOT / "templates", root / "templates", dirs_exist_ok=True)
+    (root / "data").mkdir(exist_ok=True)
+    (root / ".vault_pass").write_bytes(VAULT_PASSWORD + b"\n")
+    (root / ".env").write_text(
+        f"NEXUS_API_KEY={API_KEY}\n"
+        "NEXUS_DASHBOARD_ALLOWED_IPS=127.0.0.1\n"
+        "NEXUS_WATCH_MODE=off\n"
+    )
+    return fleet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una flota sintética para Nexus.")
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--hosts", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--scripts", type=int, default=20)
+    parser.add_argument("--skels", type=int, default=6)
+    parser.add_argument("--domains", type=int, default=4)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fleet = generate_fleet(
+        args.dest,
+        hosts=args.hosts,
+        groups=args.groups,
+        scripts=args.scripts,
+        skels=args.skels,
+        domains=args.domains,
+        users=args.users,
+        seed=args.seed,
+    )
+    print(f"✅ {len(fleet)} hosts en {args.groups} grupos generados en {args.dest}")
@@ -0,0 +1,203 @@
+"""
+Carga en proceso contra la app ASGI (httpx.ASGITransport, sin red):
+/get-task, /record, /status + /api/machines y las rutas de archivos.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .common import add_fleet_args, fleet_workdir, latency_summary, peak_rss_mb, save_results
+from .fleet import API_KEY
+
+# (método, url, kwargs de httpx)
+Call = Tuple[str, str, Dict[str, Any]]
+SCENARIOS = ("get-task", "record", "status", "static")
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, make_call: Callable[[int], Call], total: int, concurrency: int
+) -> Dict[str, Any]:
+    """Lanza `total` peticiones con `concurrency` clientes simultáneos."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    pending = iter(range(total))
+
+    async def worker():
+        # Un único iterador compartido: cada petición la coge un solo cliente
+        for i in pending:
+            method, url, kwargs = make_call(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": total,
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 1) if wall else 0.0,
+        **latency_summary(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def make_calls(
+    fleet: List[Tuple[str, str]], etags: Dict[str, str], revalidate: float, seed: int
+) -> Dict[str, Callable[[int], Call]]:
+    """Generadores de peticiones por escenario (`etags`: machine_id -> último ETag)."""
+    rng = random.Random(seed)
+    headers = {"X-Nexus-Key": API_KEY, "Accept-Encoding": "gzip"}
+    long_log = "\n".join(f"línea de log {i}" for i in range(400))
+    # Rutas servidas: /scripts/x, /skels/x y /certs/dominio/x
+    files = Path("files")
+    static_paths = sorted(
+        f"/{p.relative_to(files).as_posix()}" for p in files.rglob("*") if p.is_file()
+    )
+
+    def get_task(_: int) -> Call:
+        hostname, nexus_id = rng.choice(fleet)
+        call_headers = dict(headers)
+        # Como los agentes reales: la mayoría revalida con el ETag que ya tiene
+        if nexus_id in etags and rng.random() < revalidate:
+            call_headers["If-None-Match"] = etags[nexus_id]
+        params = {"machine_id": nexus_id, "fingerprint": f"fp-{nexus_id[:12]}"}
+        return "GET", f"/get-task/{hostname}", {"params": params, "headers": call_headers}
+
+    def record(_: int) -> Call:
+        hostname, nexus_id = rng.choice(fleet)
+        body = {"hostname": hostname, "machine_id": nexus_id, "fingerprint": f"fp-{nexus_id[:12]}"}
+        # Un informe completo de cada diez; el resto, latidos
+        if rng.random() < 0.1:
+            body["log"] = long_log
+        return "POST", "/record", {"json": body, "headers": headers}
+
+    def status(i: int) -> Call:
+        if i % 4 == 0:
+            return "GET", "/status", {}
+        return "GET", "/api/machines", {"params": {"limit": 100}}
+
+    def static(_: int) -> Call:
+        return "GET", rng.choice(static_paths), {"headers": headers}
+
+    return {"get-task": get_task, "record": record, "status": status, "static": static}
+
+
+async def seed_fleet(client: httpx.AsyncClient, fleet: List[Tuple[str, str]]):
+    """Registra todos los hosts (/record) y los aprueba, como tras el bootstrap."""
+    from sqlalchemy import update
+
+    from app.models import Machine, NodeStatus, engine, run_db
+    from app.telemetry import telemetry
+
+    headers = {"X-Nexus-Key": API_KEY}
+    for hostname, nexus_id in fleet:
+        body = {
+            "hostname": hostname,
+            "machine_id": nexus_id,
+            "fingerprint": f"fp-{nexus_id[:12]}",
+            "log": "bootstrap",
+        }
+        await client.post("/record", json=body, headers=headers)
+    await telemetry.flush()
+
+    def approve():
+        with engine.begin() as conn:
+            conn.execute(update(Machine).values(status=NodeStatus.approved))
+
+    await run_db(approve)
+
+
+async def run_load(args: argparse.Namespace, fleet: List[Tuple[str, str]]) -> Dict[str, Any]:
+    from app.main import app
+
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 40000))
+    # ASGITransport no ejecuta el lifespan: lo abrimos a mano (warm-up incluido)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            await seed_fleet(client, fleet)
+            results["seed_s"] = round(time.perf_counter() - start, 3)
+
+            etags: Dict[str, str] = {}
+            calls = make_calls(fleet, etags, args.revalidate, args.seed)
+            if "get-task" in args.scenarios:
+                # Primera pasada: un get-task por host (frío) que además deja
+                # los ETag que después revalidan los agentes
+                cold = await run_scenario(
+                    client, _first_poll(fleet, etags, client), len(fleet), args.concurrency
+                )
+                results["get-task-cold"] = cold
+                print(_format_line("cold", cold))
+
+            for name in args.scenarios:
+                results[name] = await run_scenario(
+                    client, calls[name], args.requests, args.concurrency
+                )
+                print(_format_line(name, results[name]))
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def _first_poll(
+    fleet: List[Tuple[str, str]], etags: Dict[str, str], client: httpx.AsyncClient
+) -> Callable[[int], Call]:
+    """get-task de cada host una vez; los ETag se recogen con un hook de respuesta."""
+
+    async def remember(response: httpx.Response):
+        machine_id: Optional[str] = response.request.url.params.get("machine_id")
+        if machine_id and "etag" in response.headers:
+            etags[machine_id] = response.headers["etag"]
+
+    client.event_hooks["response"] = [remember]
+    headers = {"X-Nexus-Key": API_KEY, "Accept-Encoding": "gzip"}
+
+    def call(i: int) -> Call:
+        hostname, nexus_id = fleet[i]
+        params = {"machine_id": nexus_id, "fingerprint": f"fp-{nexus_id[:12]}"}
+        return "GET", f"/get-task/{hostname}", {"params": params, "headers": headers}
+
+    return call
+
+
+def _format_line(name: str, r: Dict[str, Any]) -> str:
+    return (
+        f"{name:<10} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}ms  "
+        f"p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms  "
+        f"errores {r['errors']:<5} RSS {r['peak_rss_mb']}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga en proceso contra Nexus.")
+    add_fleet_args(parser)
+    parser.add_argument("--requests", type=int, default=2000, help="peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--revalidate", type=float, default=0.8, help="fracción de get-task con If-None-Match"
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    args = parser.parse_args()
+
+    with fleet_workdir(args) as fleet:
+        results = asyncio.run(run_load(args, fleet))
+    path = save_results("load", args, results)
+    print(f"\nResultados guardados en {path}")
+
+
+if __name__ == "__main__":
+    main()
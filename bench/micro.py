@@ -0,0 +1,180 @@
+"""
+Microbenchmarks del motor: carga de inventario (refresh_cache),
+ensamblado de scripts (assemble_script) y minificado (el minificador de
+shell al cargar plantillas frente al antiguo post-proceso por petición).
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from .common import add_fleet_args, fleet_workdir, latency_summary, peak_rss_mb, save_results
+
+
+def time_calls(fn: Callable[[], Any], repeat: int, min_time: float = 0.2) -> Dict[str, float]:
+    """Estilo timeit: `number` llamadas por ronda hasta llenar min_time; se repite."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        "best_us": round(min(rounds) * 1e6, 2),
+        "median_us": round(statistics.median(rounds) * 1e6, 2),
+        "calls_per_round": number,
+    }
+
+
+async def bench_refresh(repeat: int) -> Dict[str, Any]:
+    from app.engine import nexus_engine
+    from app.inventory import InventoryLoader
+
+    cold: List[float] = []
+    warm: List[float] = []
+    for _ in range(repeat):
+        # Frío: cargador nuevo (re-parsea y descifra todo)
+        nexus_engine._loader = InventoryLoader(str(nexus_engine.inventory_dir))
+        start = time.perf_counter()
+        await nexus_engine.refresh_cache(force=True)
+        cold.append(time.perf_counter() - start)
+        # Templado: nada cambió en disco, solo se reconstruye el snapshot
+        start = time.perf_counter()
+        await nexus_engine.refresh_cache(force=True)
+        warm.append(time.perf_counter() - start)
+    return {
+        "cold": latency_summary(cold),
+        "warm": latency_summary(warm),
+        "hosts": len(nexus_engine._snapshot.hostvars),
+    }
+
+
+async def bench_assemble(fleet: List[Tuple[str, str]], passes: int) -> Dict[str, Any]:
+    from app.engine import nexus_engine
+
+    results: Dict[str, Any] = {}
+    for n in range(passes):
+        # Pasada 0: memo de fragmentos vacío; las siguientes lo aprovechan
+        times = []
+        start = time.perf_counter()
+        for hostname, _ in fleet:
+            t0 = time.perf_counter()
+            await nexus_engine.assemble_script(hostname)
+            times.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+        results[f"pass{n}"] = {
+            "total_s": round(total, 3),
+            "hosts_per_s": round(len(fleet) / total, 1),
+            **latency_summary(times),
+        }
+    results["fragment_cache"] = nexus_engine.fragment_cache_stats().get("cache", {})
+    return results
+
+
+def legacy_minify(content: str) -> str:
+    """El antiguo NexusEngine._minify_script (referencia; rompía los heredocs)."""
+
+    def lines() -> Iterator[str]:
+        for i, line in enumerate(content.splitlines()):
+            if i == 0 and line.startswith("#!"):
+                yield line
+                continue
+            stripped = line.strip()
+            if not stripped or (stripped.startswith("#") and not stripped.startswith("#!")):
+                continue
+            yield stripped
+
+    return "\n".join(lines())
+
+
+def _throughput(timing: Dict[str, float], size: int) -> Dict[str, Any]:
+    return {**timing, "mb_per_s": round(size / (timing["best_us"] / 1e6) / 1e6, 1)}
+
+
+async def bench_minify(fleet: List[Tuple[str, str]], repeat: int) -> Dict[str, Any]:
+    from jinja2 import Environment, FileSystemLoader
+
+    from app.engine import nexus_engine
+    from app.minify import minify_shell
+
+    # Entrada realista: el workflow del primer host, renderizado desde las
+    # plantillas sin minificar (lo que recibía el post-proceso antiguo)
+    hostname = fleet[0][0]
+    snapshot = await nexus_engine.get_snapshot()
+    node_data = nexus_engine._prepare_node(snapshot, hostname)
+    names = [t.name for t in nexus_engine._load_workflow(hostname, node_data)]
+    plain = Environment(
+        loader=FileSystemLoader(str(nexus_engine.template_base)),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    raw = "\n".join(plain.get_template(n).render(node=node_data) for n in names)
+    sources = [plain.loader.get_source(plain, n)[0] for n in names]
+    source_bytes = sum(len(s.encode()) for s in sources)
+
+    # Antes: en cada petición. Ahora: una vez por carga de plantilla.
+    legacy = time_calls(lambda: legacy_minify(raw), repeat)
+    shell = time_calls(lambda: [minify_shell(s) for s in sources], repeat)
+    served = await nexus_engine.assemble_script(hostname)
+    return {
+        "legacy_per_request": {
+            **_throughput(legacy, len(raw.encode())),
+            "input_bytes": len(raw.encode()),
+            "output_bytes": len(legacy_minify(raw).encode()),
+        },
+        "shell_at_load": {
+            **_throughput(shell, source_bytes),
+            "input_bytes": source_bytes,
+            "output_bytes": sum(len(minify_shell(s).encode()) for s in sources),
+        },
+        "served_bytes": len(served.encode()),
+    }
+
+
+async def run_micro(args: argparse.Namespace, fleet: List[Tuple[str, str]]) -> Dict[str, Any]:
+    from app.engine import nexus_engine
+
+    nexus_engine.warm_up()
+    results: Dict[str, Any] = {}
+    results["refresh_cache"] = await bench_refresh(args.repeat)
+    print(f"refresh_cache  frío p50 {results['refresh_cache']['cold']['p50_ms']}ms  "
+          f"templado p50 {results['refresh_cache']['warm']['p50_ms']}ms")
+    results["assemble_script"] = await bench_assemble(fleet, args.passes)
+    for n in range(args.passes):
+        p = results["assemble_script"][f"pass{n}"]
+        print(f"assemble_script pasada {n}: {p['hosts_per_s']} hosts/s  p50 {p['p50_ms']}ms")
+    results["minify"] = await bench_minify(fleet, args.repeat)
+    old, new = results["minify"]["legacy_per_request"], results["minify"]["shell_at_load"]
+    print(f"minificado antiguo {old['best_us']}us por petición "
+          f"({old['input_bytes']} -> {old['output_bytes']} bytes)")
+    print(f"minify_shell       {new['best_us']}us por carga de plantillas "
+          f"({new['input_bytes']} -> {new['output_bytes']} bytes), 0us por petición")
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks del motor de Nexus.")
+    add_fleet_args(parser)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--passes", type=int, default=2, help="pasadas de assemble_script")
+    args = parser.parse_args()
+
+    with fleet_workdir(args) as fleet:
+        results = asyncio.run(run_micro(args, fleet))
+    path = save_results("micro", args, results)
+    print(f"\nResultados guardados en {path}")
+
+
+if __name__ == "__main__":
+    main()
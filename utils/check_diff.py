@@ -0,0 +1,50 @@
+# check_diff.py
+# Detección de cambios solo de tipo (1 -> true, 0 -> false, 1 -> 1.0) en el
+# diff entre generaciones del snapshot de inventario.
+# Uso (desde la raíz del proyecto): uv run python utils/check_diff.py
+import json
+import sys
+
+from app.inventory import InventoryLoader
+from app.snapshot import InventorySnapshot, canonical
+
+PROBE = "nexus_diff_probe"
+EDITS = ((1, True), (0, False), (1, 1.0), ("1", 1))
+
+
+def check_diff(data: dict) -> list:
+    """
+    El diff entre generaciones debe detectar cambios solo de tipo y el
+    snapshot nuevo servir el valor nuevo con un digest distinto.
+    """
+    problems = []
+    hostvars = data["_meta"]["hostvars"]
+    if not hostvars:
+        return problems
+    host = sorted(hostvars)[0]
+    for before, after in EDITS:
+        old = json.loads(json.dumps(data))
+        new = json.loads(json.dumps(data))
+        old["_meta"]["hostvars"][host][PROBE] = before
+        new["_meta"]["hostvars"][host][PROBE] = after
+        previous = InventorySnapshot.build(1, old)
+        snapshot = InventorySnapshot.build(2, new, previous)
+        if snapshot.diff.changed.get(host) != (PROBE,):
+            problems.append(f"diff {before!r} -> {after!r}: changed={dict(snapshot.diff.changed)}")
+        if canonical(snapshot.hostvars[host][PROBE]) != canonical(after):
+            problems.append(f"diff {before!r} -> {after!r}: snapshot keeps the old value")
+        if snapshot.host_digest(host) == previous.host_digest(host):
+            problems.append(f"diff {before!r} -> {after!r}: digest unchanged")
+    return problems
+
+
+if __name__ == "__main__":
+    print("Comprobando el diff entre generaciones...")
+    problems = check_diff(InventoryLoader().load())
+
+    if problems:
+        print(f"ERROR: {len(problems)} cambios no detectados:")
+        for p in problems:
+            print(f"  - {p}")
+        sys.exit(1)
+    print(f"OK: {len(EDITS)} cambios de tipo detectados.")
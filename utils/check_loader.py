@@ -0,0 +1,72 @@
+# check_loader.py
+# Paridad entre el cargador en proceso y `ansible-inventory --list`.
+# Uso (desde la raíz del proyecto): uv run python utils/check_loader.py
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from app.inventory import InventoryLoader, decrypt_vault, read_vault_password
+from app.snapshot import canonical
+
+
+def ansible_inventory() -> dict:
+    cmd = [
+        "ansible-inventory",
+        "-i",
+        "inventory/hosts.yml",
+        "--list",
+        "--vault-password-file",
+        ".vault_pass",
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True, stdin=subprocess.DEVNULL)
+    return json.loads(out.stdout)
+
+
+def reveal(value, password: bytes):
+    """ansible-inventory deja los !vault en línea cifrados; el nativo los descifra."""
+    if isinstance(value, dict) and set(value) == {"__ansible_vault"}:
+        return decrypt_vault(value["__ansible_vault"].encode(), password).decode()
+    return value
+
+
+def diff_hostvars(expected: dict, actual: dict, password: bytes) -> list:
+    problems = []
+    for host in sorted(set(expected) | set(actual)):
+        if host not in actual:
+            problems.append(f"{host}: missing in native loader")
+            continue
+        if host not in expected:
+            problems.append(f"{host}: only in native loader")
+            continue
+        for key in sorted(set(expected[host]) | set(actual[host])):
+            a = reveal(expected[host].get(key, "<absent>"), password)
+            b = actual[host].get(key, "<absent>")
+            # Comparación por tipo: 1, True y 1.0 no son el mismo valor
+            if canonical(a) != canonical(b):
+                problems.append(f"{host}.{key}: ansible={a!r} native={b!r}")
+    return problems
+
+
+if __name__ == "__main__":
+    print("Comparando ansible-inventory con el cargador nativo...")
+    reference = ansible_inventory()
+    native = InventoryLoader().load()
+
+    problems = diff_hostvars(
+        reference.get("_meta", {}).get("hostvars", {}),
+        native["_meta"]["hostvars"],
+        read_vault_password(Path(".vault_pass")),
+    )
+    # ansible-inventory solo emite all.vars con --export: comparamos si existe
+    ref_all = reference.get("all", {}).get("vars")
+    if ref_all is not None and canonical(ref_all) != canonical(native["all"]["vars"]):
+        problems.append("all.vars differ")
+
+    if problems:
+        print(f"ERROR: {len(problems)} diferencias encontradas:")
+        for p in problems:
+            print(f"  - {p}")
+        sys.exit(1)
+    hosts = len(native["_meta"]["hostvars"])
+    print(f"OK: paridad completa en {hosts} hosts.")
@@ -0,0 +1,85 @@
+# check_minify.py
+# Corpus del minificado: cada plantilla .sh.j2 de templates/ debe significar lo
+# mismo para bash antes y después de minificar.
+# Uso (desde la raíz del proyecto): uv run python utils/check_minify.py [--show]
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from jinja2 import Environment
+
+from app.minify import minify_shell
+
+JINJA_BLOCK = re.compile(r"{%.*?%}", re.S)
+JINJA_EXPR = re.compile(r"{{.*?}}", re.S)
+JINJA_COMMENT = re.compile(r"{#.*?#}", re.S)
+
+
+def neutralize(source: str) -> str:
+    """Quita Jinja para que bash pueda parsear: las expresiones pasan a una palabra."""
+    source = JINJA_COMMENT.sub("", source)
+    source = JINJA_BLOCK.sub("", source)
+    return JINJA_EXPR.sub("JINJA", source)
+
+
+def bash_canonical(script: str):
+    """
+    Forma canónica según bash: el script como cuerpo de una función y
+    `declare -f` (sin comentarios ni formato, con los heredocs intactos).
+    None si bash no lo parsea.
+    """
+    wrapper = f"__nexus_check() {{\n{script}\n}}\ndeclare -f __nexus_check\n"
+    result = subprocess.run(["bash", "-c", wrapper], capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+def check(path: Path, env: Environment):
+    """Retorna (problemas, avisos, bytes originales, bytes minificados)."""
+    problems, notes = [], []
+    original = path.read_text()
+    minified = minify_shell(original)
+
+    if minify_shell(minified) != minified:
+        problems.append("no es idempotente")
+    try:
+        env.parse(minified)
+    except Exception as e:
+        problems.append(f"Jinja no la parsea: {e}")
+    if JINJA_BLOCK.findall(original) != JINJA_BLOCK.findall(minified):
+        problems.append("cambian las etiquetas {% %}")
+
+    before = bash_canonical(neutralize(original))
+    after = bash_canonical(neutralize(minified))
+    if before is None:
+        notes.append("bash no la parsea sin Jinja: solo se comprueba Jinja")
+    elif after is None:
+        problems.append("bash no parsea la versión minificada")
+    elif before != after:
+        problems.append("bash la interpreta distinto tras minificar")
+    return problems, notes, len(original.encode()), len(minified.encode())
+
+
+if __name__ == "__main__":
+    show = "--show" in sys.argv
+    env = Environment(trim_blocks=True, lstrip_blocks=True)
+    failed = 0
+    total_in = total_out = 0
+    for path in sorted(Path("templates").rglob("*.sh.j2")):
+        problems, notes, size_in, size_out = check(path, env)
+        total_in += size_in
+        total_out += size_out
+        mark = "❌" if problems else "✅"
+        print(f"{mark} {path}  {size_in} -> {size_out} bytes")
+        for line in problems + notes:
+            print(f"     {line}")
+        if problems:
+            failed += 1
+            if show:
+                print(minify_shell(path.read_text()))
+
+    print(f"\nTotal: {total_in} -> {total_out} bytes ({1 - total_out / max(total_in, 1):.0%} menos)")
+    if failed:
+        print(f"{failed} plantillas con problemas")
+        sys.exit(1)
+    print("Minificado equivalente en todas las plantillas")
@@ -0,0 +1,55 @@
+# check_schedule.py
+# Precedencia de la línea de cron.d de la Tarea 00: un nexus_cron_schedule
+# explícito gana; sin él, el hueco estable del host (nexus_timer_interval).
+# Uso (desde la raíz del proyecto): uv run python utils/check_schedule.py
+import asyncio
+import re
+import sys
+from collections import ChainMap
+
+from app.engine import nexus_engine
+
+TEMPLATE = "tasks/00-persistence.sh.j2"
+CRON_LINE = re.compile(r"^(?P<schedule>.+?) root sleep (?P<sleep>\d+); ", re.M)
+
+
+def cron_line(node) -> tuple:
+    script = nexus_engine.jinja_env.get_template(TEMPLATE).render(node=node)
+    match = CRON_LINE.search(script)
+    if match is None:
+        raise AssertionError("línea de cron.d no encontrada en el render")
+    return match["schedule"], int(match["sleep"])
+
+
+def check(hostname: str, node) -> list:
+    problems = []
+    # El resto del inventario sin nexus_cron_schedule: solo cuenta lo que fija cada caso
+    base = {k: v for k, v in node.items() if k != "nexus_cron_schedule"}
+    slot = node["nexus_schedule"]
+    cases = [
+        ("explícito", {"nexus_cron_schedule": "*/15 * * * *"}, "*/15 * * * *"),
+        ("sin definir", {}, slot["cron"] or "*/30 * * * *"),
+        ("vacío", {"nexus_cron_schedule": ""}, slot["cron"] or "*/30 * * * *"),
+    ]
+    for label, override, expected in cases:
+        schedule, sleep = cron_line(ChainMap(override, base))
+        if schedule != expected:
+            problems.append(f"{hostname} ({label}): {schedule!r}, se esperaba {expected!r}")
+        if sleep != slot["cron_sleep"]:
+            problems.append(f"{hostname} ({label}): sleep {sleep}, se esperaba {slot['cron_sleep']}")
+    return problems
+
+
+if __name__ == "__main__":
+    nexus_engine.warm_up()
+    snapshot = asyncio.run(nexus_engine.get_snapshot())
+    problems = []
+    for hostname in sorted(snapshot.hostvars):
+        problems += check(hostname, nexus_engine._prepare_node(snapshot, hostname))
+
+    if problems:
+        print(f"ERROR: {len(problems)} problemas de precedencia:")
+        for p in problems:
+            print(f"  - {p}")
+        sys.exit(1)
+    print(f"OK: precedencia de cron.d correcta en {len(snapshot.hostvars)} hosts.")